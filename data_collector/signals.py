@@ -1,63 +1,107 @@
+from collections import defaultdict
+from decimal import Decimal
+
 from django.db import transaction
 from django.db.models import F
 from django.dispatch import receiver
-from django.db.models.signals import post_save, post_migrate
+from django.db.models.signals import post_save, post_migrate, pre_save
 from django.utils import timezone
-from typing import Optional, Dict, Union
+from typing import Optional, Dict, List, Union
 from djmoney.money import Money
 
 from orders.models import Order
-from .models import DailyOrderAnalytics, AllTimeOrderAnalytics
+from orders.outbox import (ORDER_CREATED, ORDER_COMPLETED, emit_event, order_created_event,
+                           order_completed_event, outbox_handler)
+from orders.signals import field_changed
+from .models import DailyOrderAnalytics, AllTimeOrderAnalytics, default_info_completed_orders
 
 JSONType = Dict[str, Union[str, int]]
 
 
-def update_info_completed_orders(analytics, instance):
-    """Обновление поля info_completed_orders."""
-    info_completed_orders = analytics.info_completed_orders
-
-    info_completed_orders['service'].append(instance.service.name)
-    info_completed_orders['option'].append(instance.service_option.category)
-    info_completed_orders['user'].append(instance.user.email)
-    info_completed_orders['completed'].append(instance.completed.strftime('%Y-%m-%d %H:%M:%S'))
-
-    analytics.info_completed_orders = info_completed_orders
+@receiver(pre_save, sender=Order)
+def check_order_completion(sender, instance, update_fields=None, **kwargs):
+    """Заказ переходит в completed именно этим сохранением, а не пересохраняется завершённым."""
+    instance._became_completed = (
+        instance.status == Order.ChoicesStatus.COMPLETED.value
+        and (update_fields is None or 'status' in update_fields)
+        and field_changed(instance, 'status')
+    )
 
 
 @receiver(post_save, sender=Order)
 def add_new_order_to_analytics(sender, instance, created, **kwargs):
+    """
+    Аналитика не обновляется в транзакции заказа: в outbox пишется событие,
+    счётчики обновляет drain_outbox. Завершение учитывается один раз, при смене статуса.
+    """
+    if created:
+        emit_event(*order_created_event(instance))
+    elif getattr(instance, '_became_completed', False):
+        instance._became_completed = False
+        emit_event(*order_completed_event(instance))
+
+
+@outbox_handler(ORDER_CREATED)
+def count_created_orders(payloads):
+    by_date = defaultdict(list)
+    for payload in payloads:
+        by_date[payload['date']].append(Decimal(payload['total_price']))
+    for date, prices in by_date.items():
+        date_collect, _ = DailyOrderAnalytics.objects.get_or_create(date=date)
+        add_orders_to_analytics(total_orders=len(prices), total_revenue=Money(sum(prices), currency='USD'),
+                                date_collect=date_collect)
+
+
+@outbox_handler(ORDER_COMPLETED)
+def count_completed_orders(payloads):
+    by_date = defaultdict(list)
+    for payload in payloads:
+        by_date[payload['date']].append(payload)
+    for date, completed_orders in by_date.items():
+        add_completed_orders_to_analytics(completed_orders, date)
+
+
+def add_orders_to_analytics(total_orders: int, total_revenue: Money,
+                            date_collect: Optional[DailyOrderAnalytics] = None):
+    """Учёт новых заказов одним обновлением дневной и общей аналитики."""
     with transaction.atomic():
-        date_collect, _ = DailyOrderAnalytics.objects.get_or_create(date=timezone.now().date())
+        if date_collect is None:
+            date_collect, _ = DailyOrderAnalytics.objects.get_or_create(date=timezone.now().date())
 
-        if created:
-            # Увеличиваем количество заказов и доход
-            date_collect.total_orders = F('total_orders') + 1
-            date_collect.total_revenue = F('total_revenue') + instance.total_price
-
-            # Сохраняем изменения
-            date_collect.save(update_fields=['total_orders', 'total_revenue'])
-
-            # Обновляем общую аналитику
-            update_all_analytics(total_revenue=instance.total_price, total_orders=1)
-
-        elif instance.status == 'completed':
-            # Увеличиваем количество завершённых заказов
-            date_collect.completed_orders = F('completed_orders') + 1
-
-            # Обновляем JSON-поле
-            update_info_completed_orders(date_collect, instance)
-
-            # Сохраняем изменения
-            date_collect.save(update_fields=['completed_orders', 'info_completed_orders'])
-
-            # Обновляем общую аналитику
-            update_all_analytics(completed_orders=1,
-                                 info_completed_orders={
-                                     'service': instance.service.name,
-                                     'option': instance.service_option.category,
-                                     'user': instance.user.email,
-                                     'completed': instance.completed.strftime('%Y-%m-%d %H:%M:%S')
-                                 })
+        # Увеличиваем количество заказов и доход
+        date_collect.total_orders = F('total_orders') + total_orders
+        date_collect.total_revenue = F('total_revenue') + total_revenue
+
+        # Сохраняем изменения
+        date_collect.save(update_fields=['total_orders', 'total_revenue'])
+
+        # Обновляем общую аналитику
+        update_all_analytics(total_revenue=total_revenue, total_orders=total_orders)
+
+
+def add_completed_orders_to_analytics(completed_orders: List[JSONType], date=None):
+    """
+    Учёт пачки завершённых заказов одним обновлением дневной и общей аналитики.
+    completed_orders - словари с ключами service, option, user, completed.
+    """
+    if not completed_orders:
+        return
+
+    info_completed_orders = default_info_completed_orders()
+    for completed_order in completed_orders:
+        for key, values in info_completed_orders.items():
+            values.append(completed_order[key])
+
+    with transaction.atomic():
+        date_collect, _ = DailyOrderAnalytics.objects.get_or_create(date=date or timezone.now().date())
+        date_collect = DailyOrderAnalytics.objects.select_for_update().get(pk=date_collect.pk)
+        all_date = AllTimeOrderAnalytics.objects.select_for_update().first()
+
+        for analytics in (date_collect, all_date):
+            analytics.completed_orders = F('completed_orders') + len(completed_orders)
+            for key, values in info_completed_orders.items():
+                analytics.info_completed_orders[key].extend(values)
+            analytics.save(update_fields=['completed_orders', 'info_completed_orders'])
 
 
 def update_all_analytics(total_revenue: Money = None,
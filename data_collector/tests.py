@@ -1,3 +1,40 @@
-from django.test import TestCase
+from decimal import Decimal
 
-# Create your tests here.
+from djmoney.money import Money
+
+from orders.models import Order, OutboxEvent
+from orders.outbox import ORDER_COMPLETED, ORDER_CREATED, drain_outbox
+from orders.tests import OrderTestCase
+from .models import AllTimeOrderAnalytics, DailyOrderAnalytics
+
+
+class OrderAnalyticsTests(OrderTestCase):
+
+    def setUp(self):
+        super().setUp()
+        AllTimeOrderAnalytics.objects.get_or_create()
+
+    def test_revenue_is_exact(self):
+        self.option.price_per_unit = Money('0.01', 'USD')
+        self.option.save()
+        for _ in range(3):
+            self.create_order(quantity=10)
+        self.assertEqual(OutboxEvent.objects.filter(event_type=ORDER_CREATED).first().payload['total_price'], '0.10')
+        drain_outbox(100)
+        self.assertEqual(DailyOrderAnalytics.objects.get().total_revenue.amount, Decimal('0.30'))
+        self.assertEqual(AllTimeOrderAnalytics.objects.get().total_revenue.amount, Decimal('0.30'))
+
+    def test_completion_counted_once(self):
+        order = self.create_order()
+        order.status = Order.ChoicesStatus.COMPLETED.value
+        order.save()
+        # Повторное сохранение завершённого заказа (например, правка примечаний) события не пишет
+        order.notes = 'Правка'
+        order.save()
+        self.assertEqual(OutboxEvent.objects.filter(event_type=ORDER_COMPLETED).count(), 1)
+
+        drain_outbox(100)
+        OutboxEvent.objects.all().delete()
+        order.save()
+        self.assertFalse(OutboxEvent.objects.exists())
+        self.assertEqual(DailyOrderAnalytics.objects.get().completed_orders, 1)
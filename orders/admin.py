@@ -1,12 +1,16 @@
 import json
 
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.db import transaction
+from django.db.models import Case, When, Value, DateTimeField, Q
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from django.utils.safestring import mark_safe
 
-from services.models import ServiceOption
 from users.models import CustomerUser, ReplenishmentBalance
-from .models import Order
+from .export import export_orders_response
+from .models import Order, ArchivedOrder, OutboxEvent
+from .outbox import emit_events, order_completed_event
 
 
 @admin.register(Order)
@@ -53,7 +57,9 @@ class OrderAdmin(admin.ModelAdmin):
     ]
 
     list_display_links = list_display
+    list_select_related = ['user', 'service_option__service']
     search_fields = ['user__email']
+    actions = ['mark_running', 'mark_completed', 'export_csv', 'export_ndjson']
 
     def get_fields(self, request, obj=None):
         fields = super().get_fields(request, obj)
@@ -97,17 +103,72 @@ class OrderAdmin(admin.ModelAdmin):
         elif obj.status == obj.ChoicesStatus.RUNNING.value:
             # Устанавливаем дату завершения по периоду, если она не указана
             if obj.completed is None and obj.period is not None:
-                if obj.period == ServiceOption.PeriodChoices.HOUR.value:
-                    obj.completed = timezone.now() + timezone.timedelta(hours=1)
-                elif obj.period == ServiceOption.PeriodChoices.DAY.value:
-                    obj.completed = timezone.now() + timezone.timedelta(days=1)
-                elif obj.period == ServiceOption.PeriodChoices.WEEK.value:
-                    obj.completed = timezone.now() + timezone.timedelta(weeks=1)
-                elif obj.period == ServiceOption.PeriodChoices.MONTH.value:
-                    obj.completed = timezone.now() + timezone.timedelta(days=30)
+                obj.completed = obj.get_completion_deadline(timezone.now())
 
         obj.save()  # Сохраняем объект
 
+    def get_search_results(self, request, queryset, search_term):
+        """Поиск по email пользователя и по сервису/категории, оба условия покрыты триграммными индексами."""
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        users = CustomerUser.objects.filter(email__icontains=search_term).values('pk')
+        return queryset.filter(Q(search_text__contains=search_term.lower()) | Q(user__in=users)), False
+
+    @admin.action(description='Перевести выбранные заказы в running')
+    def mark_running(self, request, queryset):
+        """
+        Один UPDATE: статус running и срок завершения по периоду, если он не указан.
+        Переводятся только заказы в pending: завершённый заказ со старым сроком планировщик
+        сразу завершил бы ещё раз, и аналитика учла бы его дважды.
+        """
+        now = timezone.now()
+        selected = queryset.count()
+        updated = queryset.filter(status=Order.ChoicesStatus.PENDING.value).update(
+            status=Order.ChoicesStatus.RUNNING.value,
+            completed=Coalesce(
+                'completed',
+                Case(
+                    *[When(period=period, then=Value(now + duration))
+                      for period, duration in Order.PERIOD_DURATIONS.items()],
+                    default=None,
+                    output_field=DateTimeField()
+                )
+            )
+        )
+        self.message_user(request, f"Переведено в running: {updated}", messages.SUCCESS)
+        if selected > updated:
+            self.message_user(request, f"Пропущено заказов не в статусе pending: {selected - updated}",
+                              messages.WARNING)
+
+    @admin.action(description='Завершить выбранные заказы')
+    def mark_completed(self, request, queryset):
+        """Один UPDATE по выбранным заказам, события для аналитики пишутся одним INSERT."""
+        now = timezone.now()
+        with transaction.atomic():
+            orders = list(
+                queryset.exclude(status=Order.ChoicesStatus.COMPLETED.value)
+                .select_for_update(of=('self',))
+                .select_related('service', 'service_option', 'user')
+            )
+            Order.objects.filter(pk__in=[order.pk for order in orders]).update(
+                status=Order.ChoicesStatus.COMPLETED.value,
+                completed=Coalesce('completed', Value(now)),
+                admin_completed_order=request.user.email
+            )
+            for order in orders:
+                order.completed = order.completed or now
+            emit_events([order_completed_event(order) for order in orders])
+        self.message_user(request, f"Завершено заказов: {len(orders)}", messages.SUCCESS)
+
+    @admin.action(description='Выгрузить выбранные заказы в CSV')
+    def export_csv(self, request, queryset):
+        return export_orders_response(queryset, 'csv')
+
+    @admin.action(description='Выгрузить выбранные заказы в NDJSON')
+    def export_ndjson(self, request, queryset):
+        return export_orders_response(queryset, 'ndjson')
+
     @admin.display(description='User Rating', ordering='user__rating')
     def get_user_rating_display(self, obj):
         """Метод для отображения звёзд вместо цифр"""
@@ -117,6 +178,41 @@ class OrderAdmin(admin.ModelAdmin):
         return True
 
 
+@admin.register(ArchivedOrder)
+class ArchivedOrderAdmin(admin.ModelAdmin):
+    list_display = ['id', 'service_name', 'option_name', 'user', 'status', 'total_price', 'created_at',
+                    'completed']
+    list_display_links = list_display
+    list_select_related = ['user']
+    list_filter = ['created_at']
+    search_fields = ['id', 'service_name', 'option_name']
+    ordering = ['-created_at']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(admin.ModelAdmin):
+    list_display = ['id', 'event_type', 'dedup_key', 'created_at', 'processed_at', 'attempts']
+    list_display_links = list_display
+    list_filter = ['event_type', 'processed_at']
+    search_fields = ['dedup_key']
+    readonly_fields = ['event_type', 'dedup_key', 'payload', 'created_at', 'processed_at', 'last_error']
+    actions = ['retry_events']
+
+    @admin.action(description='Повторить обработку выбранных событий')
+    def retry_events(self, request, queryset):
+        updated = queryset.filter(processed_at__isnull=True).update(attempts=0, last_error='')
+        self.message_user(request, f"Возвращено в очередь событий: {updated}", messages.SUCCESS)
+
+    def has_add_permission(self, request):
+        return False
+
+
 @admin.register(ReplenishmentBalance)
 class ReplenishmentBalanceAdmin(admin.ModelAdmin):
     fields = [
@@ -0,0 +1,49 @@
+import logging
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from users.models import BalanceHistory
+from .models import Order, ArchivedOrder
+
+logger = logging.getLogger(__name__)
+
+
+def archive_orders_batch(created_before, batch_size):
+    """
+    Переносит до batch_size завершённых заказов, созданных раньше created_before, в ArchivedOrder.
+    История баланса перепривязывается к архивной записи до удаления заказа.
+    Возвращает количество перенесённых заказов.
+    """
+    with transaction.atomic():
+        orders = list(
+            Order.objects.filter(status=Order.ChoicesStatus.COMPLETED.value, created_at__lt=created_before)
+            .select_for_update(skip_locked=True, of=('self',))
+            .select_related('service', 'service_option')
+            .order_by('created_at', 'id')[:batch_size]
+        )
+        if not orders:
+            return 0
+
+        order_ids = [order.pk for order in orders]
+        ArchivedOrder.objects.bulk_create([ArchivedOrder.from_order(order) for order in orders],
+                                          ignore_conflicts=True)
+        BalanceHistory.objects.filter(order_id__in=order_ids).update(archived_order_id=F('order_id'), order=None)
+        Order.objects.filter(pk__in=order_ids).delete()
+    return len(orders)
+
+
+def archive_orders(months, batch_size=1000):
+    """Переносит в архив все завершённые заказы старше months месяцев (месяц считается за 30 дней)."""
+    created_before = timezone.now() - timedelta(days=30 * months)
+    total = 0
+    while True:
+        archived = archive_orders_batch(created_before, batch_size)
+        total += archived
+        if archived < batch_size:
+            break
+    if total:
+        logger.info(f"В архив перенесено заказов: {total} (созданы до {created_before:%Y-%m-%d})")
+    return total
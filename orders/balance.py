@@ -0,0 +1,41 @@
+from decimal import Decimal
+
+from django.db import connection
+from djmoney.money import Money
+
+from users.models import CustomerUser
+
+
+class InsufficientFundsError(ValueError):
+    """Баланс пользователя меньше суммы списания."""
+
+
+def debit_balance(user, amount: Money):
+    """
+    Списывает сумму с баланса пользователя одним условным UPDATE.
+
+    Проверка средств и списание выполняются в одном запросе, поэтому две
+    параллельные покупки не могут уйти в минус. Возвращает кортеж
+    (старый баланс, новый баланс). Вызывать внутри transaction.atomic().
+    """
+    table = connection.ops.quote_name(CustomerUser._meta.db_table)
+    balance = connection.ops.quote_name(CustomerUser._meta.get_field('balance').column)
+    currency = connection.ops.quote_name(CustomerUser._meta.get_field('balance_currency').column)
+    pk = connection.ops.quote_name(CustomerUser._meta.pk.column)
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {table} SET {balance} = {balance} - %s '
+            f'WHERE {pk} = %s AND {currency} = %s AND {balance} >= %s '
+            f'RETURNING {balance}',
+            [amount.amount, user.pk, str(amount.currency), amount.amount]
+        )
+        row = cursor.fetchone()
+
+    if row is None:
+        raise InsufficientFundsError({"detail": "У пользователя недостаточно средств для завершения покупки."})
+
+    new_balance = Money(Decimal(str(row[0])).quantize(Decimal('0.01')), amount.currency)
+    old_balance = new_balance + amount
+    user.balance = new_balance
+    return old_balance, new_balance
@@ -0,0 +1,95 @@
+from django.db import transaction
+from djmoney.money import Money
+
+from services.discounts import DiscountResolver
+from services.models import ServiceOption
+from services.schema import get_custom_data_schemas
+from users.models import BalanceHistory
+from .balance import debit_balance
+from .models import Order
+from .outbox import emit_events, order_created_event
+from .pricing import OrderPricing
+
+MAX_BATCH_SIZE = 500
+
+
+def create_orders_batch(user, items):
+    """
+    Создание пачки заказов за фиксированное число запросов.
+
+    Опции, схемы custom_data и индивидуальные скидки загружаются одним запросом
+    каждые, сумма всех валидных позиций списывается одним UPDATE, заказы, история
+    баланса и события outbox вставляются через bulk_create в одной транзакции.
+    Возвращает список результатов по каждой позиции в порядке входных данных.
+    """
+    option_ids = {item['service_option'] for item in items}
+    options = ServiceOption.objects.select_related('service').in_bulk(option_ids)
+    schemas = get_custom_data_schemas(options)
+    discounts = DiscountResolver(user, options)
+
+    results = [None] * len(items)
+    orders = []
+    for index, item in enumerate(items):
+        service_option = options.get(item['service_option'])
+        if service_option is None:
+            results[index] = {'index': index, 'status': 'error',
+                              'detail': "The specified option of the service does not exist."}
+            continue
+        if service_option.service_id != item['service']:
+            results[index] = {'index': index, 'status': 'error',
+                              'detail': "The specified service does not exist."}
+            continue
+        if service_option.is_interval_required and not item.get('interval'):
+            results[index] = {'index': index, 'status': 'error',
+                              'detail': "For the selected option, you need to specify the interval."}
+            continue
+
+        custom_data_error = schemas[service_option.pk].get_errors(item['custom_data'])
+        if custom_data_error:
+            results[index] = {'index': index, 'status': 'error', 'detail': custom_data_error}
+            continue
+
+        pricing = OrderPricing(service_option, user, item['quantity'], discounts.get_user_discount(service_option.pk))
+        order = Order(
+            service=service_option.service,
+            service_option=service_option,
+            user=user,
+            custom_data=item['custom_data'],
+            quantity=item['quantity'],
+            period=item.get('period') or service_option.period,
+            interval=item.get('interval') if service_option.is_interval_required else None,
+            notes=item.get('notes', ''),
+            total_price=pricing.total_price,
+        )
+        order.update_denormalized_fields()
+        orders.append((index, order))
+
+    if orders:
+        total_price = sum((order.total_price for _, order in orders), Money(0, currency="USD"))
+
+        with transaction.atomic():
+            old_balance, _ = debit_balance(user, total_price)
+            created = Order.objects.bulk_create([order for _, order in orders])
+
+            # История баланса по каждому заказу, как при поштучной покупке
+            history = []
+            balance = old_balance
+            for order in created:
+                history.append(BalanceHistory(
+                    user=user,
+                    old_balance=balance,
+                    new_balance=balance - order.total_price,
+                    order=order,
+                    transaction_type=BalanceHistory.TransactionType.PURCHASE.value
+                ))
+                balance -= order.total_price
+            BalanceHistory.objects.bulk_create(history)
+
+            # bulk_create не вызывает post_save - события для аналитики пишем сами
+            emit_events([order_created_event(order) for order in created])
+
+        for index, order in orders:
+            results[index] = {'index': index, 'status': 'created', 'id': order.pk,
+                              'total_price': order.total_price.amount}
+
+    return results
@@ -0,0 +1,92 @@
+import csv
+import heapq
+import json
+from operator import itemgetter
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+EXPORT_CHUNK_SIZE = 2000
+
+# (поле для values_list, заголовок столбца)
+EXPORT_FIELDS = [
+    ('id', 'id'),
+    ('service__name', 'service'),
+    ('service_option__category', 'service_option'),
+    ('user__email', 'user'),
+    ('quantity', 'quantity'),
+    ('total_price', 'total_price'),
+    ('status', 'status'),
+    ('period', 'period'),
+    ('interval', 'interval'),
+    ('created_at', 'created_at'),
+    ('completed', 'completed'),
+    ('custom_data', 'custom_data'),
+    ('notes', 'notes'),
+]
+
+# В архиве названия сервиса и опции хранятся текстом (см. ArchivedOrder)
+ARCHIVED_EXPORT_LOOKUPS = {
+    'service__name': 'service_name',
+    'service_option__category': 'option_name',
+}
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+class Echo:
+    """Псевдо-файл для csv.writer: возвращает строку вместо записи в буфер."""
+
+    def write(self, value):
+        return value
+
+
+def iter_order_rows(queryset, archived_queryset=None):
+    """
+    Строки заказов кортежами, порциями через серверный курсор, без создания моделей.
+    Архивные заказы (archived_queryset) вливаются в общий поток по id: id в архиве совпадают с исходными.
+    """
+    rows = (
+        queryset.order_by('id')
+        .values_list(*[field for field, _ in EXPORT_FIELDS])
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+    if archived_queryset is None:
+        return rows
+    archived_rows = (
+        archived_queryset.order_by('id')
+        .values_list(*[ARCHIVED_EXPORT_LOOKUPS.get(field, field) for field, _ in EXPORT_FIELDS])
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+    return heapq.merge(rows, archived_rows, key=itemgetter(0))
+
+
+def stream_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow([header for _, header in EXPORT_FIELDS])
+    custom_data_index = [field for field, _ in EXPORT_FIELDS].index('custom_data')
+    for row in rows:
+        row = list(row)
+        row[custom_data_index] = json.dumps(row[custom_data_index], ensure_ascii=False)
+        yield writer.writerow(row)
+
+
+def stream_ndjson(rows):
+    headers = [header for _, header in EXPORT_FIELDS]
+    for row in rows:
+        yield json.dumps(dict(zip(headers, row)), cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+def export_orders_response(queryset, export_format='csv', filename='orders', archived_queryset=None):
+    """Потоковый ответ с выгрузкой заказов: память не зависит от количества строк."""
+    stream = stream_ndjson if export_format == 'ndjson' else stream_csv
+    export_format = export_format if export_format in EXPORT_FORMATS else 'csv'
+    rows = iter_order_rows(queryset, archived_queryset)
+    response = StreamingHttpResponse(stream(rows), content_type=EXPORT_FORMATS[export_format])
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{export_format}"'
+    # nginx отдаёт поток клиенту сразу, не накапливая его в буфере
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,87 @@
+import hashlib
+import json
+import logging
+from functools import wraps
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import IdempotencyKey
+
+logger = logging.getLogger(__name__)
+
+
+def get_request_hash(request):
+    """Хэш метода, пути и тела запроса для сверки повторов с одним ключом."""
+    body = json.dumps(request.data, sort_keys=True, cls=JSONEncoder)
+    return hashlib.sha256(f'{request.method}:{request.path}:{body}'.encode()).hexdigest()
+
+
+def purge_expired_keys():
+    """Удаляет ключи старше IDEMPOTENCY_KEY_TTL. Возвращает количество удалённых записей."""
+    expired_before = timezone.now() - settings.IDEMPOTENCY_KEY_TTL
+    deleted, _ = IdempotencyKey.objects.filter(created_at__lt=expired_before).delete()
+    return deleted
+
+
+def idempotent(view_method):
+    """
+    Декоратор метода APIView: повтор запроса с тем же заголовком Idempotency-Key
+    получает сохранённый ответ, сам метод повторно не вызывается.
+
+    Ответы 5xx и исключения не сохраняются, такой запрос можно повторить.
+    """
+
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get('Idempotency-Key')
+        if not key:
+            return view_method(self, request, *args, **kwargs)
+
+        if len(key) > IdempotencyKey._meta.get_field('key').max_length:
+            return Response({"detail": "Idempotency-Key is too long."}, status=status.HTTP_400_BAD_REQUEST)
+
+        request_hash = get_request_hash(request)
+        record, created = IdempotencyKey.objects.get_or_create(
+            user=request.user, key=key, defaults={'request_hash': request_hash}
+        )
+
+        if not created and record.created_at < timezone.now() - settings.IDEMPOTENCY_KEY_TTL:
+            # Ключ истёк, но ещё не вычищен командой purge_idempotency_keys
+            record.delete()
+            record, created = IdempotencyKey.objects.get_or_create(
+                user=request.user, key=key, defaults={'request_hash': request_hash}
+            )
+
+        if not created:
+            if record.request_hash != request_hash:
+                return Response({"detail": "Idempotency-Key was already used with a different request."},
+                                status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+            if record.response_status is None:
+                return Response({"detail": "A request with this Idempotency-Key is still being processed."},
+                                status=status.HTTP_409_CONFLICT)
+
+            logger.info(f"Повтор запроса с Idempotency-Key={key}, возвращаем сохранённый ответ")
+            response = Response(record.response_body, status=record.response_status)
+            response['Idempotent-Replayed'] = 'true'
+            return response
+
+        try:
+            response = view_method(self, request, *args, **kwargs)
+        except Exception:
+            record.delete()
+            raise
+
+        if response.status_code >= 500:
+            record.delete()
+            return response
+
+        record.response_status = response.status_code
+        record.response_body = response.data
+        record.save(update_fields=['response_status', 'response_body'])
+        return response
+
+    return wrapper
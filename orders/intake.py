@@ -0,0 +1,87 @@
+import logging
+
+from django.db import transaction
+
+from users.models import BalanceHistory
+from .balance import debit_balance
+from .models import Order, OrderIntake
+from .outbox import emit_events, order_created_event
+
+logger = logging.getLogger(__name__)
+
+
+def queue_order(validated_data, pricing):
+    """
+    Асинхронный приём заказа: резервирует средства и ставит проверенный запрос в очередь.
+    В запросе только условный UPDATE баланса и один INSERT в OrderIntake - заказ с его индексами,
+    история баланса и события пишутся в process_order_intake. Цена нужна для резерва и считается
+    в запросе (см. OrderCreateSerializer.validate). Возвращает запись очереди.
+    """
+    service_option = validated_data['service_option']
+    period = validated_data.get('period') or service_option.period
+    with transaction.atomic():
+        old_balance, new_balance = debit_balance(pricing.user, pricing.total_price)
+        return OrderIntake.objects.create(
+            user=pricing.user,
+            service_option=service_option,
+            custom_data=validated_data['custom_data'],
+            quantity=validated_data['quantity'],
+            period=getattr(period, 'value', period),
+            interval=validated_data.get('interval') if service_option.is_interval_required else None,
+            notes=validated_data.get('notes', ''),
+            total_price=pricing.total_price,
+            old_balance=old_balance,
+            new_balance=new_balance,
+        )
+
+
+def process_intake_batch(batch_size):
+    """
+    Создаёт до batch_size заказов из очереди асинхронного приёма: заказы, историю баланса
+    и события outbox вставляет через bulk_create. Записи очереди захватываются FOR UPDATE SKIP LOCKED,
+    поэтому потоки и процессы не мешают друг другу. Возвращает количество созданных заказов.
+    """
+    with transaction.atomic():
+        intakes = list(
+            OrderIntake.objects.select_for_update(skip_locked=True, of=('self',))
+            .filter(order__isnull=True)
+            .select_related('service_option__service')
+            .order_by('id')[:batch_size]
+        )
+        if not intakes:
+            return 0
+
+        orders = []
+        for intake in intakes:
+            order = Order(
+                service=intake.service_option.service,
+                service_option=intake.service_option,
+                user_id=intake.user_id,
+                custom_data=intake.custom_data,
+                quantity=intake.quantity,
+                period=intake.period,
+                interval=intake.interval,
+                notes=intake.notes,
+                total_price=intake.total_price,
+            )
+            order.update_denormalized_fields()
+            orders.append(order)
+        created = Order.objects.bulk_create(orders)
+
+        BalanceHistory.objects.bulk_create([
+            BalanceHistory(
+                user_id=intake.user_id,
+                old_balance=intake.old_balance,
+                new_balance=intake.new_balance,
+                order=order,
+                transaction_type=BalanceHistory.TransactionType.PURCHASE.value
+            )
+            for intake, order in zip(intakes, created)
+        ])
+        # bulk_create не вызывает post_save - события пишем сами
+        emit_events([order_created_event(order) for order in created])
+
+        for intake, order in zip(intakes, created):
+            intake.order = order
+        OrderIntake.objects.bulk_update(intakes, ['order'])
+    return len(intakes)
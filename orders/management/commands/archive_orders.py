@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from orders.archive import archive_orders
+
+
+class Command(BaseCommand):
+    help = ('Переносит завершённые заказы старше заданного количества месяцев в таблицу архивных заказов, '
+            'чтобы основная таблица заказов содержала только актуальные данные.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int, default=6, help='Возраст заказа в месяцах (по 30 дней)')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Заказов за одну транзакцию')
+
+    def handle(self, *args, **options):
+        archived = archive_orders(options['months'], options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Перенесено в архив заказов: {archived}'))
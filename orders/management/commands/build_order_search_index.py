@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from orders.models import Order
+from users.models import CustomerUser
+
+# (имя индекса, модель, выражение) - выражения совпадают с тем, что Django генерирует для contains и icontains
+SEARCH_INDEXES = [
+    ('order_search_text_trgm_idx', Order, '(search_text::text) gin_trgm_ops'),
+    ('customeruser_email_trgm_idx', CustomerUser, '(UPPER(email::text)) gin_trgm_ops'),
+]
+
+
+class Command(BaseCommand):
+    help = ('Разовая подготовка поиска по заказам: заполняет пустой search_text порциями и создаёт '
+            'триграммные GIN-индексы через CREATE INDEX CONCURRENTLY, не блокируя запись в таблицы. '
+            'Запускать отдельно от migrate, повторный запуск безопасен.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument('--skip-backfill', action='store_true', help='Только создать индексы')
+
+    def handle(self, *args, **options):
+        if not options['skip_backfill']:
+            # Каждая порция сохраняется отдельной транзакцией, таблица целиком не блокируется
+            Order.refresh_search_text(Order.objects.filter(search_text=''), chunk_size=options['chunk_size'])
+            self.stdout.write(self.style.SUCCESS('search_text заполнен'))
+
+        if connection.vendor != 'postgresql':
+            # На SQLite поиск работает тем же LIKE, но без индекса
+            self.stdout.write('Индексы создаются только в PostgreSQL')
+            return
+
+        with connection.cursor() as cursor:
+            cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            for name, model, expression in SEARCH_INDEXES:
+                # Прерванный CREATE INDEX CONCURRENTLY оставляет невалидный индекс, IF NOT EXISTS его пропустил бы
+                cursor.execute('SELECT NOT indisvalid FROM pg_index WHERE indexrelid = to_regclass(%s)', [name])
+                row = cursor.fetchone()
+                if row and row[0]:
+                    cursor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
+                table = connection.ops.quote_name(model._meta.db_table)
+                cursor.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} USING gin ({expression})')
+                self.stdout.write(self.style.SUCCESS(f'Индекс {name} готов'))
@@ -0,0 +1,40 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from orders.outbox import drain_outbox, purge_processed_events
+
+PURGE_INTERVAL = timedelta(hours=1)
+
+
+class Command(BaseCommand):
+    help = ('Воркер outbox: обрабатывает события заказов и баланса (аналитика и т.д.) пачками. '
+            'Можно запускать несколько процессов параллельно.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Событий за одну транзакцию')
+        parser.add_argument('--interval', type=float, default=1, help='Пауза, если очередь пуста, секунд')
+        parser.add_argument('--keep-days', type=int, default=7, help='Сколько дней хранить обработанные события')
+        parser.add_argument('--once', action='store_true', help='Разобрать очередь один раз и выйти')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        keep = timedelta(days=options['keep_days'])
+        total = 0
+        purged_at = None
+        while True:
+            processed = drain_outbox(batch_size)
+            total += processed
+            # Если пачка заполнена целиком, очередь ещё не разобрана - продолжаем без паузы
+            if processed == batch_size:
+                continue
+            if options['once']:
+                self.stdout.write(self.style.SUCCESS(f'Обработано событий: {total}'))
+                return
+            now = timezone.now()
+            if purged_at is None or now - purged_at > PURGE_INTERVAL:
+                purge_processed_events(now - keep)
+                purged_at = now
+            time.sleep(options['interval'])
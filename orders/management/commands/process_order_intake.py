@@ -0,0 +1,54 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from orders.intake import process_intake_batch
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = ('Воркер асинхронного приёма заказов: создаёт заказы, историю баланса и события для запросов, '
+            'принятых с ответом 202. Пул потоков, у каждого потока своё соединение с БД.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='Количество потоков')
+        parser.add_argument('--batch-size', type=int, default=100, help='Заказов за одну транзакцию')
+        parser.add_argument('--interval', type=float, default=0.5, help='Пауза, если очередь пуста, секунд')
+        parser.add_argument('--once', action='store_true', help='Разобрать очередь один раз и выйти')
+
+    def handle(self, *args, **options):
+        stop = threading.Event()
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            futures = [pool.submit(self.work, stop, options) for _ in range(options['workers'])]
+            try:
+                processed = sum(future.result() for future in futures)
+            except KeyboardInterrupt:
+                stop.set()
+                raise
+        self.stdout.write(self.style.SUCCESS(f'Обработано заказов: {processed}'))
+
+    def work(self, stop, options):
+        batch_size = options['batch_size']
+        total = 0
+        try:
+            while not stop.is_set():
+                close_old_connections()
+                try:
+                    processed = process_intake_batch(batch_size)
+                except Exception as e:
+                    logger.error(f"Ошибка приёма заказов: {e}")
+                    processed = 0
+                total += processed
+                # Если пачка заполнена целиком, очередь ещё не разобрана - продолжаем без паузы
+                if processed == batch_size:
+                    continue
+                if options['once']:
+                    break
+                stop.wait(options['interval'])
+        finally:
+            connection.close()
+        return total
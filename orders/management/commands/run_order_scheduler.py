@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from orders.scheduler import run_scheduler_step
+
+
+class Command(BaseCommand):
+    help = ('Воркер жизненного цикла заказов: назначает срок запущенным заказам и завершает просроченные. '
+            'Можно запускать несколько процессов параллельно.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Заказов за одну транзакцию')
+        parser.add_argument('--interval', type=float, default=10, help='Пауза между проходами, секунд')
+        parser.add_argument('--once', action='store_true', help='Выполнить один проход и выйти')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        while True:
+            scheduled, completed = run_scheduler_step(batch_size)
+            if options['once']:
+                self.stdout.write(self.style.SUCCESS(f'Назначен срок: {scheduled}, завершено заказов: {completed}'))
+                return
+            # Если хотя бы одна пачка заполнена целиком, очередь ещё не разобрана - продолжаем без паузы
+            if scheduled < batch_size and completed < batch_size:
+                time.sleep(options['interval'])
@@ -1,9 +1,13 @@
-from django.db import models
+from datetime import timedelta
+
+from django.db import models, transaction
 from djmoney.models.fields import MoneyField
-from djmoney.money import Money
+from rest_framework.utils.encoders import JSONEncoder
 
 from users.models import CustomerUser, BalanceHistory
 from services.models import Service, ServiceOption
+from .balance import debit_balance
+from .pricing import OrderPricing
 
 
 class Order(models.Model):
@@ -12,6 +16,22 @@ class Order(models.Model):
         RUNNING = 'running'
         COMPLETED = 'completed'
 
+    # Порядок периодов для сортировки, хранится в period_rank, чтобы сортировка шла по индексу
+    PERIOD_RANKS = {
+        ServiceOption.PeriodChoices.HOUR.value: 1,
+        ServiceOption.PeriodChoices.DAY.value: 2,
+        ServiceOption.PeriodChoices.WEEK.value: 3,
+        ServiceOption.PeriodChoices.MONTH.value: 4,
+    }
+
+    # Срок выполнения заказа в статусе running по периоду
+    PERIOD_DURATIONS = {
+        ServiceOption.PeriodChoices.HOUR.value: timedelta(hours=1),
+        ServiceOption.PeriodChoices.DAY.value: timedelta(days=1),
+        ServiceOption.PeriodChoices.WEEK.value: timedelta(weeks=1),
+        ServiceOption.PeriodChoices.MONTH.value: timedelta(days=30),
+    }
+
     service = models.ForeignKey(Service, on_delete=models.CASCADE, verbose_name="Сервис")
     service_option = models.ForeignKey(ServiceOption, on_delete=models.CASCADE, verbose_name='Опции')
     user = models.ForeignKey(CustomerUser, related_name="orders", on_delete=models.CASCADE, verbose_name='Пользователь')
@@ -35,14 +55,55 @@ class Order(models.Model):
     completed = models.DateTimeField(null=True, blank=True, verbose_name='Время завершения')
     admin_completed_order = models.CharField(max_length=255, blank=True, null=True,
                                              verbose_name='Завершено администратором')
+    period_rank = models.PositiveSmallIntegerField(null=True, blank=True, editable=False,
+                                                   verbose_name='Порядок периода')
+    # Название сервиса и категория опции в нижнем регистре, в PostgreSQL под триграммным GIN-индексом
+    # (создаётся командой build_order_search_index)
+    search_text = models.TextField(blank=True, default='', editable=False, verbose_name='Поисковая строка')
 
     def calculate_total_price(self):
+        # Цена, уже рассчитанная в рамках запроса (см. OrderCreateSerializer), не пересчитывается
+        pricing = getattr(self, 'pricing', None)
+        if pricing is not None and pricing.applies_to(self):
+            return pricing.total_price
         try:
-            discounted_price = self.service_option.get_discounted_price(user=self.user)
-            return Money(discounted_price * self.quantity, currency="USD")
+            return OrderPricing.resolve(self.service_option, self.user, self.quantity).total_price
         except Exception as e:
             raise ValueError({"detail":f"Ошибка при расчёте цены: {str(e)}"})
 
+    def update_denormalized_fields(self):
+        """Заполняет вычисляемые поля. Вызывать и перед bulk_create, там save() не вызывается."""
+        # period может прийти членом PeriodChoices (default опции), а не строкой
+        self.period_rank = self.PERIOD_RANKS.get(getattr(self.period, 'value', self.period))
+        self.search_text = self.build_search_text(self.service, self.service_option)
+
+    @staticmethod
+    def build_search_text(service, service_option):
+        return f'{service.name} {service_option.category}'.lower()
+
+    @classmethod
+    def refresh_search_text(cls, queryset, chunk_size=2000):
+        """Пересчитывает search_text, например после переименования сервиса или категории."""
+        orders = queryset.select_related('service', 'service_option').only(
+            'id', 'search_text', 'service__name', 'service_option__category'
+        )
+        batch = []
+        for order in orders.iterator(chunk_size=chunk_size):
+            search_text = cls.build_search_text(order.service, order.service_option)
+            if order.search_text != search_text:
+                order.search_text = search_text
+                batch.append(order)
+            if len(batch) >= chunk_size:
+                cls.objects.bulk_update(batch, ['search_text'])
+                batch = []
+        if batch:
+            cls.objects.bulk_update(batch, ['search_text'])
+
+    def get_completion_deadline(self, start):
+        """Время завершения заказа, запущенного в start, или None, если период не задан."""
+        duration = self.PERIOD_DURATIONS.get(getattr(self.period, 'value', self.period))
+        return start + duration if duration else None
+
     def save(self, *args, **kwargs):
         if not self.period:
             self.period = self.service_option.period
@@ -53,32 +114,183 @@ class Order(models.Model):
         if not self.service_option.is_interval_required:
             self.interval = None
 
-        self.total_price = self.calculate_total_price()
+        self.update_denormalized_fields()
+
+        # Оплата списывается только при создании заказа, правки в админке баланс не трогают
+        if not self._state.adding:
+            return super(Order, self).save(*args, **kwargs)
 
-        if self.user.balance < self.total_price:
-            raise ValueError({"detail": "У пользователя недостаточно средств для завершения покупки."})
+        self.total_price = self.calculate_total_price()
 
-            # Сначала сохраняем заказ
-        super(Order, self).save(*args, **kwargs)
+        with transaction.atomic():
+            # Проверка средств и списание одним UPDATE, без повторного чтения пользователя
+            old_balance, new_balance = debit_balance(self.user, self.total_price)
 
-        # Затем обновляем баланс пользователя
-        old_balance = self.user.balance
-        self.user.balance -= self.total_price
-        self.user.save(admin_transaction=False)
+            super(Order, self).save(*args, **kwargs)
 
-        # Создаем запись в истории баланса, уже имея ID заказа
-        BalanceHistory.objects.create(
-            user=self.user,
-            old_balance=old_balance,
-            new_balance=self.user.balance,
-            order=self,
-            transaction_type=BalanceHistory.TransactionType.PURCHASE.value
-        )
+            # Создаем запись в истории баланса, уже имея ID заказа
+            BalanceHistory.objects.create(
+                user=self.user,
+                old_balance=old_balance,
+                new_balance=new_balance,
+                order=self,
+                transaction_type=BalanceHistory.TransactionType.PURCHASE.value
+            )
 
     class Meta:
         verbose_name = "Заказ"
         verbose_name_plural = "Заказы"
         ordering = ['created_at']
+        indexes = [
+            # Курсорная пагинация списка заказов пользователя
+            models.Index(fields=['user', 'created_at', 'id'], name='order_user_created_idx'),
+            models.Index(fields=['user', 'period_rank', 'id'], name='order_user_period_idx'),
+            models.Index(fields=['user', 'status', 'id'], name='order_user_status_idx'),
+            models.Index(fields=['user', 'completed', 'id'], name='order_user_completed_idx'),
+            # Выборка заказов, у которых наступил срок завершения (run_order_scheduler)
+            models.Index(fields=['status', 'completed'], name='order_status_completed_idx'),
+            # Сортировка changelist админки и выборки аналитики/архивации по дате
+            models.Index(fields=['created_at'], name='order_created_idx'),
+        ]
 
     def __str__(self):
         return f'Заказ ID: {self.pk}, услуга: {self.service_option}, пользователь: {self.user}'
+
+
+class OrderIntake(models.Model):
+    """
+    Заказ, принятый с ответом 202: проверенные данные запроса и резерв средств.
+    Заказ, историю баланса и события создаёт process_order_intake и проставляет order,
+    до этого запись стоит в очереди.
+    """
+    user = models.ForeignKey(CustomerUser, related_name='order_intakes', on_delete=models.CASCADE,
+                             verbose_name='Пользователь')
+    # Пока заказ в очереди, средства уже списаны: опцию с такими записями удалить нельзя.
+    # Обработанные записи удаляются вместе со своими заказами (каскад Order -> OrderIntake)
+    service_option = models.ForeignKey(ServiceOption, on_delete=models.RESTRICT, verbose_name='Опции')
+    custom_data = models.JSONField(verbose_name='Поля')
+    quantity = models.IntegerField(verbose_name='Количество')
+    period = models.CharField(max_length=50, blank=True, null=True, choices=ServiceOption.PeriodChoices.choices,
+                              verbose_name='Период')
+    interval = models.PositiveIntegerField(null=True, blank=True, verbose_name='Интервал')
+    notes = models.TextField(blank=True, verbose_name='Примечания')
+    total_price = MoneyField('Сумма заказа', decimal_places=2, default=0, default_currency='USD', max_digits=15)
+    old_balance = MoneyField('Баланс до списания', decimal_places=2, default=0, default_currency='USD',
+                             max_digits=15)
+    new_balance = MoneyField('Баланс после списания', decimal_places=2, default=0, default_currency='USD',
+                             max_digits=15)
+    order = models.OneToOneField(Order, null=True, blank=True, on_delete=models.CASCADE, related_name='intake',
+                                 verbose_name='Заказ')
+    queued_at = models.DateTimeField(auto_now_add=True, verbose_name='Поставлен в очередь')
+
+    class Meta:
+        verbose_name = "Заказ в очереди приёма"
+        verbose_name_plural = "Заказы в очереди приёма"
+        indexes = [
+            # Очередь process_order_intake: только ещё не созданные заказы
+            models.Index(fields=['id'], condition=models.Q(order__isnull=True), name='order_intake_queued_idx'),
+        ]
+
+    def __str__(self):
+        return f'Приём ID: {self.pk}, заказ: {self.order_id or "в очереди"}, с {self.queued_at}'
+
+
+class ArchivedOrder(models.Model):
+    """
+    Завершённый заказ, перенесённый из Order командой archive_orders.
+    id совпадает с id исходного заказа, названия сервиса и опции сохраняются как текст.
+    """
+    id = models.BigIntegerField(primary_key=True, verbose_name='ID заказа')
+    user = models.ForeignKey(CustomerUser, related_name="archived_orders", on_delete=models.CASCADE,
+                             verbose_name='Пользователь')
+    service_name = models.CharField(max_length=255, verbose_name="Сервис")
+    option_name = models.CharField(max_length=255, verbose_name='Опция')
+    custom_data = models.JSONField(verbose_name='Поля')
+    quantity = models.IntegerField(verbose_name='Количество')
+    total_price = MoneyField(max_digits=15, decimal_places=2, verbose_name='Общая сумма заказа', default=0,
+                             default_currency="USD")
+    status = models.CharField(max_length=50, choices=Order.ChoicesStatus.choices, verbose_name='Статус')
+    period = models.CharField(max_length=50, blank=True, null=True, choices=ServiceOption.PeriodChoices.choices,
+                              verbose_name='Период')
+    interval = models.PositiveIntegerField(null=True, blank=True, verbose_name="Интервал (1-60)")
+    created_at = models.DateTimeField(verbose_name='Дата создания')
+    notes = models.TextField(blank=True, verbose_name="Примечания")
+    completed = models.DateTimeField(null=True, blank=True, verbose_name='Время завершения')
+    admin_completed_order = models.CharField(max_length=255, blank=True, null=True,
+                                             verbose_name='Завершено администратором')
+    archived_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата архивации')
+
+    @classmethod
+    def from_order(cls, order):
+        return cls(
+            id=order.pk,
+            user_id=order.user_id,
+            service_name=order.service.name,
+            option_name=order.service_option.category,
+            custom_data=order.custom_data,
+            quantity=order.quantity,
+            total_price=order.total_price,
+            status=order.status,
+            period=order.period,
+            interval=order.interval,
+            created_at=order.created_at,
+            notes=order.notes,
+            completed=order.completed,
+            admin_completed_order=order.admin_completed_order,
+        )
+
+    class Meta:
+        verbose_name = "Архивный заказ"
+        verbose_name_plural = "Архивные заказы"
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['user', 'created_at', 'id'], name='archived_order_user_idx'),
+        ]
+
+    def __str__(self):
+        return f'Архивный заказ ID: {self.pk}, услуга: {self.option_name}, пользователь: {self.user_id}'
+
+
+class OutboxEvent(models.Model):
+    """
+    Событие, записанное в той же транзакции, что и изменение заказа.
+    Обрабатывается командой drain_outbox; dedup_key не даёт записать одно событие дважды.
+    """
+    event_type = models.CharField(max_length=50, verbose_name='Тип события')
+    dedup_key = models.CharField(max_length=255, unique=True, verbose_name='Ключ дедупликации')
+    payload = models.JSONField(encoder=JSONEncoder, verbose_name='Данные')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+    processed_at = models.DateTimeField(null=True, blank=True, verbose_name='Дата обработки')
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name='Неудачных попыток')
+    last_error = models.TextField(blank=True, verbose_name='Последняя ошибка')
+
+    class Meta:
+        verbose_name = "Событие outbox"
+        verbose_name_plural = "События outbox"
+        indexes = [
+            # Очередь необработанных событий - частичный индекс остаётся маленьким
+            models.Index(fields=['id'], name='outbox_pending_idx', condition=models.Q(processed_at__isnull=True)),
+            models.Index(fields=['processed_at'], name='outbox_processed_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.event_type} ({self.dedup_key})'
+
+
+class IdempotencyKey(models.Model):
+    """Сохранённый ответ на запрос с заголовком Idempotency-Key."""
+    user = models.ForeignKey(CustomerUser, on_delete=models.CASCADE, related_name='idempotency_keys',
+                             verbose_name='Пользователь')
+    key = models.CharField(max_length=255, verbose_name='Ключ')
+    request_hash = models.CharField(max_length=64, verbose_name='Хэш запроса')
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True, verbose_name='Статус ответа')
+    response_body = models.JSONField(null=True, blank=True, encoder=JSONEncoder, verbose_name='Тело ответа')
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Дата создания')
+
+    class Meta:
+        verbose_name = "Ключ идемпотентности"
+        verbose_name_plural = "Ключи идемпотентности"
+        unique_together = ('user', 'key')
+
+    def __str__(self):
+        return f'{self.key} ({self.user})'
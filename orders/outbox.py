@@ -0,0 +1,140 @@
+import logging
+import uuid
+from collections import defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+ORDER_CREATED = 'order.created'
+ORDER_COMPLETED = 'order.completed'
+# Переименован сервис или категория опции: search_text их заказов пересчитывается в воркере
+SEARCH_TEXT_STALE = 'order.search_text_stale'
+
+MAX_ATTEMPTS = 5
+
+_handlers = defaultdict(list)
+
+
+def outbox_handler(event_type):
+    """
+    Регистрирует обработчик событий типа event_type. Обработчик получает список payload.
+    Он выполняется в одной транзакции с отметкой о выполнении событий, поэтому изменения в БД,
+    в том числе неидемпотентные F()-инкременты, применяются один раз на событие. Повторную запись
+    одного факта отсекает только dedup_key, пока событие не удалено purge_processed_events:
+    событие нужно писать один раз, в момент самого изменения.
+    """
+
+    def decorator(func):
+        _handlers[event_type].append(func)
+        return func
+
+    return decorator
+
+
+def emit_events(events):
+    """
+    Записывает события (event_type, dedup_key, payload) одним INSERT.
+    Вызывать внутри транзакции, в которой меняются сами данные. Повторы по dedup_key игнорируются.
+    """
+    OutboxEvent.objects.bulk_create(
+        [OutboxEvent(event_type=event_type, dedup_key=dedup_key, payload=payload)
+         for event_type, dedup_key, payload in events],
+        ignore_conflicts=True
+    )
+
+
+def emit_event(event_type, dedup_key, payload):
+    emit_events([(event_type, dedup_key, payload)])
+
+
+def order_created_event(order):
+    return ORDER_CREATED, f'{ORDER_CREATED}:{order.pk}', {
+        'order_id': order.pk,
+        'service_option_id': order.service_option_id,
+        'created_at': order.created_at,
+        # Строкой: JSONEncoder превращает Decimal во float, а сумма нужна точной
+        'total_price': str(order.total_price.amount),
+        'currency': str(order.total_price.currency),
+        'date': timezone.now().date(),
+    }
+
+
+def order_completed_event(order):
+    """Заказ должен быть загружен с select_related('service', 'service_option', 'user')."""
+    completed = order.completed or timezone.now()
+    return ORDER_COMPLETED, f'{ORDER_COMPLETED}:{order.pk}', {
+        'order_id': order.pk,
+        'service': order.service.name,
+        'option': order.service_option.category,
+        'user': order.user.email,
+        'completed': completed.strftime('%Y-%m-%d %H:%M:%S'),
+        'date': timezone.now().date(),
+    }
+
+
+def search_text_stale_event(service_id=None, service_option_id=None):
+    """Каждое переименование - отдельное событие: ключ с прошлого раза мог ещё не быть удалён из outbox."""
+    target = f'service:{service_id}' if service_id is not None else f'option:{service_option_id}'
+    return SEARCH_TEXT_STALE, f'{SEARCH_TEXT_STALE}:{target}:{uuid.uuid4().hex}', {
+        'service_id': service_id,
+        'service_option_id': service_option_id,
+    }
+
+
+def _dispatch(events):
+    by_type = defaultdict(list)
+    for event in events:
+        by_type[event.event_type].append(event.payload)
+    for event_type, payloads in by_type.items():
+        for handler in _handlers.get(event_type, []):
+            handler(payloads)
+
+
+def drain_outbox(batch_size):
+    """
+    Обрабатывает до batch_size событий. Пачка захватывается FOR UPDATE SKIP LOCKED, поэтому
+    несколько воркеров не берут одни и те же события. Обработчики и отметка о выполнении
+    выполняются в одной транзакции: при падении воркера события останутся в очереди.
+    Возвращает количество обработанных событий.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        events = list(
+            OutboxEvent.objects.filter(processed_at__isnull=True, attempts__lt=MAX_ATTEMPTS)
+            .select_for_update(skip_locked=True)
+            .order_by('id')[:batch_size]
+        )
+        if not events:
+            return 0
+
+        try:
+            with transaction.atomic():
+                _dispatch(events)
+            processed = events
+        except Exception as e:
+            # Ищем событие, на котором падает обработка, остальные проводим по одному
+            logger.error(f"Ошибка обработки пачки outbox, повтор по одному событию: {e}")
+            processed = []
+            for event in events:
+                try:
+                    with transaction.atomic():
+                        _dispatch([event])
+                    processed.append(event)
+                except Exception as event_error:
+                    logger.error(f"Ошибка обработки события outbox {event.dedup_key}: {event_error}")
+                    event.attempts += 1
+                    event.last_error = str(event_error)
+                    event.save(update_fields=['attempts', 'last_error'])
+
+        OutboxEvent.objects.filter(pk__in=[event.pk for event in processed]).update(processed_at=now)
+    return len(processed)
+
+
+def purge_processed_events(processed_before):
+    """Удаляет обработанные события старше processed_before. Возвращает количество удалённых."""
+    deleted, _ = OutboxEvent.objects.filter(processed_at__lt=processed_before).delete()
+    return deleted
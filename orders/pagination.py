@@ -0,0 +1,169 @@
+import json
+from base64 import b64decode, b64encode
+from datetime import datetime
+from decimal import Decimal
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Курсорная пагинация по паре (поле сортировки, id).
+
+    В отличие от OFFSET, следующая страница выбирается условием
+    WHERE (field, id) > (последнее значение, последний id), поэтому глубокие
+    страницы стоят столько же, сколько первая, если есть индекс (..., field, id).
+
+    Допустимые поля сортировки берутся из словаря view.ordering_fields
+    (имя параметра -> lookup), направление задаётся параметром ordering.
+    Значения NULL идут в конце при сортировке по возрастанию и в начале при убывании.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    cursor_query_param = 'cursor'
+    ordering_param = 'ordering'
+    default_ordering = '-created_at'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.ordering_term, lookup, descending = self.get_ordering(request, view)
+        page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+        reverse = cursor is not None and cursor['reverse']
+
+        nullable = self.is_nullable(queryset.model, lookup)
+        # Направление просмотра: для предыдущей страницы идём в обратную сторону и разворачиваем результат
+        after = descending == reverse
+
+        queryset = queryset.annotate(cursor_value=F(lookup))
+        if cursor is not None:
+            queryset = queryset.filter(self.get_position_filter(lookup, after, cursor, nullable))
+
+        # NULL стоят там же, где их ставит PostgreSQL по умолчанию: в конце при ASC и в начале при DESC,
+        # поэтому прямой и обратный проход используют один и тот же индекс
+        if after:
+            value_order = F(lookup).asc(nulls_last=True) if nullable else F(lookup).asc()
+        else:
+            value_order = F(lookup).desc(nulls_first=True) if nullable else F(lookup).desc()
+        queryset = queryset.order_by(value_order, 'id' if after else '-id')
+
+        results = list(queryset[:page_size + 1])
+        has_more = len(results) > page_size
+        page = results[:page_size]
+        if reverse:
+            page.reverse()
+
+        self.has_next = bool(page) and (has_more if not reverse else True)
+        self.has_previous = bool(page) and (has_more if reverse else cursor is not None)
+        self.page = page
+        return page
+
+    def get_ordering(self, request, view):
+        ordering_fields = getattr(view, 'ordering_fields', {})
+        term = request.query_params.get(self.ordering_param, '').split(',')[0].strip() or self.default_ordering
+        name = term.lstrip('-')
+        if name not in ordering_fields:
+            term = self.default_ordering
+            name = term.lstrip('-')
+        return term, ordering_fields.get(name, name), term.startswith('-')
+
+    def is_nullable(self, model, lookup):
+        try:
+            return model._meta.get_field(lookup).null
+        except FieldDoesNotExist:
+            return False
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_position_filter(self, lookup, after, cursor, nullable):
+        value, pk = cursor['value'], cursor['id']
+        value_cmp = f'{lookup}__gt' if after else f'{lookup}__lt'
+        value_bound = f'{lookup}__gte' if after else f'{lookup}__lte'
+        id_cmp = 'id__gt' if after else 'id__lt'
+
+        if value is None:
+            # Позиция внутри группы NULL
+            position = Q(**{f'{lookup}__isnull': True, id_cmp: pk})
+            return position if after else position | Q(**{f'{lookup}__isnull': False})
+
+        # (field, id) > (value, pk) в виде, который планировщик превращает в диапазон по индексу
+        position = Q(**{value_bound: value}) & (Q(**{value_cmp: value}) | Q(**{id_cmp: pk}))
+        if nullable and after:
+            position |= Q(**{f'{lookup}__isnull': True})
+        return position
+
+    def encode_cursor(self, instance, reverse):
+        value = instance.cursor_value
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        elif isinstance(value, Decimal):
+            value = str(value)
+        payload = {'o': self.ordering_term, 'v': value, 'id': instance.pk, 'r': reverse}
+        return b64encode(json.dumps(payload).encode()).decode()
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            payload = json.loads(b64decode(encoded.encode()).decode())
+            cursor = {'value': payload['v'], 'id': int(payload['id']), 'reverse': bool(payload['r'])}
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        if payload.get('o') != self.ordering_term:
+            # Курсор выдан для другой сортировки
+            raise NotFound(self.invalid_cursor_message)
+        return cursor
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return replace_query_param(self.base_url, self.cursor_query_param,
+                                   self.encode_cursor(self.page[-1], reverse=False))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        return replace_query_param(self.base_url, self.cursor_query_param,
+                                   self.encode_cursor(self.page[0], reverse=True))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {'name': self.cursor_query_param, 'required': False, 'in': 'query',
+             'schema': {'type': 'string'}},
+            {'name': self.page_size_query_param, 'required': False, 'in': 'query',
+             'schema': {'type': 'integer'}},
+        ]
@@ -0,0 +1,46 @@
+from djmoney.money import Money
+
+from services.pricing import from_cents, from_micros, line_total_cents, unit_price_micros
+from services.tiers import get_effective_discount_bp
+
+
+class OrderPricing:
+    """
+    Цена заказа, рассчитанная один раз на запрос.
+
+    Хранит опцию, сервис, индивидуальную скидку пользователя и итоговую сумму
+    с учётом объёмной скидки за количество,
+    чтобы сериализатор, проверка баланса и Order.save не пересчитывали цену
+    и не запрашивали скидку повторно.
+    """
+
+    def __init__(self, service_option, user, quantity, user_discount_percentage=0):
+        self.service_option = service_option
+        self.service = service_option.service
+        self.user = user
+        self.quantity = int(quantity)
+        self.user_discount_percentage = user_discount_percentage
+        price_cents = service_option.price_cents
+        discount_bp = get_effective_discount_bp(service_option, user_discount_percentage, self.quantity)
+        self.unit_price_micros = unit_price_micros(price_cents, discount_bp)
+        # Сумма округляется до центов так же, как хранится в БД, чтобы списание совпадало с заказом
+        self.total_cents = line_total_cents(price_cents, discount_bp, self.quantity)
+        self.total_price = Money(from_cents(self.total_cents), currency="USD")
+
+    @property
+    def unit_price(self):
+        """Точная цена за единицу со скидкой."""
+        return from_micros(self.unit_price_micros)
+
+    @classmethod
+    def resolve(cls, service_option, user, quantity):
+        """Расчёт с загрузкой индивидуальной скидки (один запрос)."""
+        return cls(service_option, user, quantity, service_option.get_user_discount(user))
+
+    def applies_to(self, order):
+        """Рассчитана ли цена для этого заказа."""
+        return (
+            order.service_option_id == self.service_option.pk
+            and order.user_id == self.user.pk
+            and int(order.quantity) == self.quantity
+        )
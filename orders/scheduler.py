@@ -0,0 +1,78 @@
+import logging
+
+from django.db import transaction
+from django.db.models import Case, When, Value
+from django.utils import timezone
+
+from .models import Order
+from .outbox import emit_events, order_completed_event
+
+logger = logging.getLogger(__name__)
+
+SCHEDULER_NAME = 'scheduler'
+
+
+def claim_orders(queryset, batch_size):
+    """
+    Забирает до batch_size заказов под блокировку FOR UPDATE SKIP LOCKED.
+    Строки, уже занятые другим воркером, пропускаются, поэтому воркеры не ждут друг друга.
+    Вызывать внутри transaction.atomic().
+    """
+    return list(
+        queryset.select_for_update(skip_locked=True, of=('self',))
+        .select_related('service', 'service_option', 'user')
+        .order_by('completed', 'id')[:batch_size]
+    )
+
+
+def schedule_running_orders(batch_size, now=None):
+    """Проставляет срок завершения запущенным заказам, у которых он не указан."""
+    now = now or timezone.now()
+    with transaction.atomic():
+        orders = claim_orders(
+            Order.objects.filter(status=Order.ChoicesStatus.RUNNING.value, completed__isnull=True,
+                                 period__isnull=False),
+            batch_size
+        )
+        if not orders:
+            return 0
+
+        Order.objects.filter(pk__in=[order.pk for order in orders]).update(
+            completed=Case(
+                *[When(period=period, then=Value(now + duration))
+                  for period, duration in Order.PERIOD_DURATIONS.items()],
+                default=None
+            )
+        )
+    return len(orders)
+
+
+def complete_due_orders(batch_size, now=None):
+    """Переводит в completed запущенные заказы, у которых наступил срок, и пишет события в outbox."""
+    now = now or timezone.now()
+    with transaction.atomic():
+        orders = claim_orders(
+            Order.objects.filter(status=Order.ChoicesStatus.RUNNING.value, completed__lte=now),
+            batch_size
+        )
+        if not orders:
+            return 0
+
+        Order.objects.filter(pk__in=[order.pk for order in orders]).update(
+            status=Order.ChoicesStatus.COMPLETED.value,
+            admin_completed_order=SCHEDULER_NAME
+        )
+        emit_events([order_completed_event(order) for order in orders])
+    return len(orders)
+
+
+def run_scheduler_step(batch_size, now=None):
+    """
+    Один проход планировщика. Возвращает (назначено сроков, завершено заказов): каждый этап
+    ограничен batch_size отдельно, поэтому и заполненность пачки проверяется по этапам.
+    """
+    scheduled = schedule_running_orders(batch_size, now)
+    completed = complete_due_orders(batch_size, now)
+    if scheduled or completed:
+        logger.info(f"Планировщик заказов: назначен срок {scheduled}, завершено {completed}")
+    return scheduled, completed
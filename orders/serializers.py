@@ -1,7 +1,11 @@
 from rest_framework import serializers
 
-from orders.models import Order
+from orders.models import Order, ArchivedOrder
+from services.models import ServiceOption
+from services.schema import get_custom_data_schema
 from users.models import ReplenishmentBalance
+from .batch import MAX_BATCH_SIZE
+from .pricing import OrderPricing
 from .validators import ControlBalance
 
 
@@ -27,6 +31,9 @@ class OrderGetAllSerializer(serializers.ModelSerializer):
 
 class OrderCreateSerializer(serializers.ModelSerializer, ControlBalance):
     user = serializers.HiddenField(default=serializers.CurrentUserDefault())
+    # Сервис берётся из опции: опция и сервис загружаются одним запросом
+    service = serializers.IntegerField(source='service_id')
+    service_option = serializers.PrimaryKeyRelatedField(queryset=ServiceOption.objects.select_related('service'))
     interval = serializers.IntegerField(required=False, allow_null=True, min_value=1, max_value=60, default=None)
 
     class Meta:
@@ -47,6 +54,9 @@ class OrderCreateSerializer(serializers.ModelSerializer, ControlBalance):
         service_option = data.get('service_option')
         if not service_option:
             raise serializers.ValidationError({"detail": "The service option is not indicated."})
+        if data.pop('service_id', None) != service_option.service_id:
+            raise serializers.ValidationError({"detail": "The specified service does not exist."})
+        data['service'] = service_option.service
 
         # Проверка интервала
         if service_option.is_interval_required and not data.get('interval'):
@@ -54,10 +64,18 @@ class OrderCreateSerializer(serializers.ModelSerializer, ControlBalance):
         if not service_option.is_interval_required and 'interval' in data:
             data.pop('interval')
 
-        # Вызываем проверку баланса пользователя
+        # Обязательные поля опции проверяются по закэшированной схеме, без запроса к M2M
+        custom_data_error = get_custom_data_schema(service_option.pk).get_errors(data.get('custom_data'))
+        if custom_data_error:
+            raise serializers.ValidationError({"detail": custom_data_error})
+
+        # Цена считается один раз и переиспользуется в Order.save
         user = data.get('user')
+        self.pricing = OrderPricing.resolve(service_option, user, data.get('quantity') or 0)
+
+        # Вызываем проверку баланса пользователя
         try:
-            self.check_balance(user)
+            self.check_balance(user, self.pricing)
         except serializers.ValidationError as e:
             # Переносим ошибку на уровень detail
             raise serializers.ValidationError({"detail": e.detail})
@@ -69,7 +87,39 @@ class OrderCreateSerializer(serializers.ModelSerializer, ControlBalance):
         service_option = validated_data.get('service_option')
         period = validated_data.get('period', service_option.period)
         validated_data['period'] = period
-        return super().create(validated_data)
+        order = Order(**validated_data)
+        order.pricing = self.pricing
+        order.save()
+        return order
+
+
+class OrderBatchItemSerializer(serializers.Serializer):
+    """Позиция пакетного заказа. Связи передаются id, объекты загружаются пачкой."""
+    service = serializers.IntegerField()
+    service_option = serializers.IntegerField()
+    custom_data = serializers.JSONField()
+    quantity = serializers.IntegerField(min_value=1)
+    period = serializers.ChoiceField(choices=ServiceOption.PeriodChoices.choices, required=False, allow_null=True)
+    interval = serializers.IntegerField(required=False, allow_null=True, min_value=1, max_value=60, default=None)
+    notes = serializers.CharField(required=False, allow_blank=True, default='')
+
+
+class OrderBatchCreateSerializer(serializers.Serializer):
+    orders = serializers.ListField(child=serializers.DictField(), allow_empty=False, max_length=MAX_BATCH_SIZE)
+
+    def validate_orders(self, orders):
+        # Каждая позиция проверяется отдельно, чтобы вернуть ошибки по индексам
+        errors = {}
+        validated = []
+        for index, item in enumerate(orders):
+            item_serializer = OrderBatchItemSerializer(data=item)
+            if item_serializer.is_valid():
+                validated.append(item_serializer.validated_data)
+            else:
+                errors[index] = item_serializer.errors
+        if errors:
+            raise serializers.ValidationError(errors)
+        return validated
 
 
 class ReplenishmentBalanceCreateSerializer(serializers.ModelSerializer):
@@ -84,6 +134,24 @@ class ReplenishmentBalanceCreateSerializer(serializers.ModelSerializer):
         ]
 
 
+class ArchivedOrderDetailSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ArchivedOrder
+        fields = [
+            'id',
+            'service_name',
+            'option_name',
+            'custom_data',
+            'quantity',
+            'total_price',
+            'status',
+            'period',
+            'interval',
+            'created_at',
+            'notes',
+        ]
+
+
 class OrderDetailSerializer(serializers.ModelSerializer):
     service_name = serializers.CharField(source='service.name', read_only=True)
     option_name = serializers.CharField(source='service_option.name', read_only=True)
@@ -0,0 +1,64 @@
+from django.db.models import Case, Q, When, Value
+from django.db.models.signals import post_migrate, post_save, pre_save
+from django.dispatch import receiver
+
+from services.models import Service, ServiceOption
+from .models import Order
+from .outbox import SEARCH_TEXT_STALE, emit_event, outbox_handler, search_text_stale_event
+
+
+@receiver(post_migrate)
+def fill_order_period_rank(sender, **kwargs):
+    """Заполняет period_rank у заказов, созданных до появления поля."""
+    if sender.name == 'orders':
+        updated = Order.objects.filter(period_rank__isnull=True, period__isnull=False).update(
+            period_rank=Case(
+                *[When(period=period, then=Value(rank)) for period, rank in Order.PERIOD_RANKS.items()],
+                default=None
+            )
+        )
+        if updated:
+            print(f"Заполнен period_rank у {updated} заказов.")
+
+
+def field_changed(instance, field):
+    """Изменилось ли поле уже сохранённого объекта (один запрос по первичному ключу)."""
+    if instance._state.adding or instance.pk is None:
+        return False
+    previous = type(instance).objects.filter(pk=instance.pk).values_list(field, flat=True).first()
+    return previous is not None and previous != getattr(instance, field)
+
+
+@receiver(pre_save, sender=Service)
+def check_service_name_change(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or 'name' in update_fields:
+        instance._search_text_stale = field_changed(instance, 'name')
+
+
+@receiver(pre_save, sender=ServiceOption)
+def check_option_category_change(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or 'category' in update_fields:
+        instance._search_text_stale = field_changed(instance, 'category')
+
+
+@receiver(post_save, sender=Service)
+def queue_search_text_refresh_on_service_change(sender, instance, created, **kwargs):
+    """Пересчёт search_text всех заказов сервиса идёт в drain_outbox, а не в запросе админки."""
+    if not created and getattr(instance, '_search_text_stale', False):
+        instance._search_text_stale = False
+        emit_event(*search_text_stale_event(service_id=instance.pk))
+
+
+@receiver(post_save, sender=ServiceOption)
+def queue_search_text_refresh_on_option_change(sender, instance, created, **kwargs):
+    if not created and getattr(instance, '_search_text_stale', False):
+        instance._search_text_stale = False
+        emit_event(*search_text_stale_event(service_option_id=instance.pk))
+
+
+@outbox_handler(SEARCH_TEXT_STALE)
+def refresh_stale_search_text(payloads):
+    service_ids = {payload['service_id'] for payload in payloads if payload['service_id'] is not None}
+    option_ids = {payload['service_option_id'] for payload in payloads if payload['service_option_id'] is not None}
+    Order.refresh_search_text(Order.objects.filter(Q(service_id__in=service_ids) | Q(service_option_id__in=option_ids)))
+
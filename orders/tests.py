@@ -1,3 +1,165 @@
+import json
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import RestrictedError
 from django.test import TestCase
+from django.utils import timezone
+from djmoney.money import Money
+from rest_framework.test import APIClient
+
+from services.cache import _local
+from services.models import Service, ServiceOption
+from starkstore.testing import QueryBudgetMixin
+from users.models import BalanceHistory, CustomerUser
+from .intake import process_intake_batch
+from .models import ArchivedOrder, Order, OrderIntake, OutboxEvent
+from .outbox import ORDER_CREATED
+from .scheduler import run_scheduler_step
+
+
+class OrderTestCase(TestCase):
+    client_class = APIClient
+
+    def setUp(self):
+        cache.clear()
+        _local.clear()
+        self.user = CustomerUser.objects.create_user(email='user@example.com', password='password',
+                                                     balance=Money(10000, 'USD'))
+        self.client.force_authenticate(self.user)
+        self.service = Service.objects.create(name='YouTube')
+        self.option = ServiceOption.objects.create(service=self.service, category='Views',
+                                                   price_per_unit=Money('0.50', 'USD'))
+
+    def create_order(self, quantity=100):
+        return Order.objects.create(service=self.service, service_option=self.option, user=self.user,
+                                    quantity=quantity, custom_data={})
+
+    def make_orders(self, count):
+        for _ in range(Order.objects.filter(user=self.user).count(), count):
+            self.create_order()
+
+
+class OrderQueryBudgetTests(QueryBudgetMixin, OrderTestCase):
+
+    def test_order_list(self):
+        self.assertQueryBudget('/api/v1/order/all/', self.make_orders)
+
+    def test_order_list_filtered(self):
+        self.assertQueryBudget('/api/v1/order/all/', self.make_orders,
+                               data={'q': 'views', 'ordering': '-total_price'})
+
+
+class OrderIntakeTests(OrderTestCase):
+    """Асинхронный приём: в запросе только резерв средств, заказ создаёт process_order_intake."""
+
+    def post_order(self):
+        return self.client.post('/api/v1/order/create/', {
+            'service': self.service.pk, 'service_option': self.option.pk, 'custom_data': {}, 'quantity': 100,
+        }, format='json', HTTP_PREFER='respond-async')
+
+    def test_request_reserves_funds_without_order(self):
+        response = self.post_order()
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['total_price'], Decimal('50.00'))
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.balance, Money('9950.00', 'USD'))
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(BalanceHistory.objects.exists())
+
+        status_response = self.client.get(response['Location'])
+        self.assertEqual(status_response.data, {'id': response.data['id'], 'status': 'queued'})
+
+    def test_worker_creates_order(self):
+        response = self.post_order()
+        self.assertEqual(process_intake_batch(10), 1)
+        self.assertEqual(process_intake_batch(10), 0)
+
+        order = Order.objects.get(intake=response.data['id'])
+        self.assertEqual((order.user, order.quantity, order.total_price), (self.user, 100, Money('50.00', 'USD')))
+        self.assertEqual(order.search_text, 'youtube views')
+        history = BalanceHistory.objects.get(order=order)
+        self.assertEqual((history.old_balance, history.new_balance),
+                         (Money('10000.00', 'USD'), Money('9950.00', 'USD')))
+        self.assertEqual(list(OutboxEvent.objects.values_list('event_type', flat=True)), [ORDER_CREATED])
+
+        status_response = self.client.get(response['Location'])
+        self.assertEqual(status_response.data['order_id'], order.pk)
+        self.assertTrue(status_response['Location'].endswith(f'/api/v1/order/{order.pk}/'))
+
+    def test_queued_intake_blocks_option_deletion(self):
+        self.post_order()
+        with self.assertRaises(RestrictedError):
+            self.option.delete()
+        with self.assertRaises(RestrictedError):
+            self.service.delete()
+        # Резерв не пропал: заказ и история появятся после обработки очереди
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.balance, Money('9950.00', 'USD'))
+        self.assertEqual(process_intake_batch(10), 1)
+        self.assertEqual(BalanceHistory.objects.get(user=self.user).new_balance, Money('9950.00', 'USD'))
+
+        # Обработанная запись удаляется вместе с заказом
+        self.option.delete()
+        self.assertFalse(OrderIntake.objects.exists())
+
+    def test_insufficient_funds(self):
+        self.user.balance = Money(10, 'USD')
+        self.user.save(update_fields=['balance'])
+        self.assertEqual(self.post_order().status_code, 400)
+        self.assertFalse(OrderIntake.objects.exists())
+
+
+class ArchivedOrderTests(QueryBudgetMixin, OrderTestCase):
+    """Заказы, перенесённые в архив, остаются в выгрузке и в отдельном списке."""
+
+    def archive(self, order):
+        order.status = Order.ChoicesStatus.COMPLETED.value
+        ArchivedOrder.from_order(order).save()
+        order.delete()
+
+    def make_archived_orders(self, count):
+        for _ in range(ArchivedOrder.objects.filter(user=self.user).count(), count):
+            self.archive(self.create_order())
+
+    def export(self, **params):
+        response = self.client.get('/api/v1/order/export/', {'export_format': 'ndjson', **params})
+        return [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+
+    def test_export_includes_archived_orders(self):
+        orders = [self.create_order() for _ in range(3)]
+        ids = [order.pk for order in orders]
+        self.archive(orders[1])
+        rows = self.export()
+        self.assertEqual([row['id'] for row in rows], ids)
+        self.assertEqual((rows[1]['service'], rows[1]['service_option'], rows[1]['status']),
+                         ('YouTube', 'Views', 'completed'))
+        self.assertEqual(rows[0]['user'], rows[1]['user'])
+
+    def test_export_filters_archived_orders(self):
+        self.archive(self.create_order())
+        self.assertEqual(len(self.export(q='youtube views')), 1)
+        self.assertEqual(len(self.export(service='tube')), 1)
+        self.assertEqual(self.export(q='likes'), [])
+        self.assertEqual(self.export(status='pending'), [])
+
+    def test_archived_list(self):
+        self.assertQueryBudget('/api/v1/order/archived/', self.make_archived_orders)
+        response = self.client.get('/api/v1/order/archived/', {'q': 'views'})
+        self.assertEqual(len(response.data['results']), 10)
+
+
+class SchedulerTests(OrderTestCase):
+
+    def test_step_reports_phases_separately(self):
+        orders = [self.create_order() for _ in range(3)]
+        Order.objects.filter(pk__in=[order.pk for order in orders]).update(status=Order.ChoicesStatus.RUNNING.value)
+        now = timezone.now()
 
-# Create your tests here.
+        self.assertEqual(run_scheduler_step(2, now), (2, 0))
+        self.assertEqual(run_scheduler_step(2, now), (1, 0))
+        later = now + timedelta(hours=2)
+        self.assertEqual(run_scheduler_step(2, later), (0, 2))
+        self.assertEqual(run_scheduler_step(2, later), (0, 1))
+        self.assertEqual(Order.objects.filter(status=Order.ChoicesStatus.COMPLETED.value).count(), 3)
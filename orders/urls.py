@@ -1,9 +1,22 @@
 from django.urls import path, include
-from .views import OrderGetAllView, OrderCreateView, ReplenishmentBalanceCreateView, OrderDetailView
+from .views import (
+    OrderGetAllView,
+    ArchivedOrderListView,
+    OrderExportView,
+    OrderCreateView,
+    OrderBatchCreateView,
+    ReplenishmentBalanceCreateView,
+    OrderDetailView,
+    OrderIntakeDetailView
+)
 
 urlpatterns = [
     path('all/', OrderGetAllView.as_view()),
+    path('archived/', ArchivedOrderListView.as_view()),
+    path('export/', OrderExportView.as_view()),
     path('create/', OrderCreateView.as_view()),
+    path('batch/', OrderBatchCreateView.as_view()),
     path('balance/', ReplenishmentBalanceCreateView.as_view()),
-    path('<int:id_order>/', OrderDetailView.as_view()),
+    path('<int:id_order>/', OrderDetailView.as_view(), name='order-detail'),
+    path('intake/<int:id_intake>/', OrderIntakeDetailView.as_view(), name='order-intake-detail'),
 ]
@@ -1,73 +1,174 @@
 import logging
 
-from django.db.models import Case, When, Value, IntegerField
+from django.conf import settings
+from django.db.models import Value
+from django.db.models.functions import Concat, Lower
 from django_filters import rest_framework as filters
 from rest_framework import serializers, status
-from rest_framework.filters import OrderingFilter
-from rest_framework.generics import ListAPIView, CreateAPIView
+from rest_framework.generics import ListAPIView, CreateAPIView, GenericAPIView
 from rest_framework.response import Response
+from rest_framework.reverse import reverse
 from rest_framework.views import exception_handler, APIView
 
-from services.models import ServiceOption
+from services.models import Service, ServiceOption
 from users.models import ReplenishmentBalance
-from .models import Order
+from .balance import InsufficientFundsError
+from .batch import create_orders_batch
+from .export import EXPORT_FORMATS, export_orders_response
+from .idempotency import idempotent
+from .intake import queue_order
+from .models import Order, ArchivedOrder, OrderIntake
+from .pagination import KeysetPagination
 from .serializers import (
     OrderGetAllSerializer,
     OrderCreateSerializer,
+    OrderBatchCreateSerializer,
     ReplenishmentBalanceCreateSerializer,
-    OrderDetailSerializer
+    OrderDetailSerializer,
+    ArchivedOrderDetailSerializer
 )
 
 logger = logging.getLogger(__name__)
 
 
 class OrderFilter(filters.FilterSet):
-    service = filters.CharFilter(field_name="service__name", lookup_expr="icontains", label="Сервис")
-    service_option = filters.CharFilter(field_name="service_option__name", lookup_expr="icontains",
-                                        label="Опции сервиса")
+    # Каталог маленький: сначала ищем id сервисов/опций, затем фильтруем заказы по индексу внешнего ключа
+    service = filters.CharFilter(method="filter_service", label="Сервис")
+    service_option = filters.CharFilter(method="filter_service_option", label="Опции сервиса")
+    q = filters.CharFilter(method="filter_search", label="Поиск по сервису и категории")
 
     class Meta:
         model = Order
         fields = ["id", "service", "service_option", "status", "created_at", "completed", "quantity", "total_price"]
 
+    def filter_service(self, queryset, name, value):
+        return queryset.filter(service__in=Service.objects.filter(name__icontains=value).values('pk'))
+
+    def filter_service_option(self, queryset, name, value):
+        return queryset.filter(
+            service_option__in=ServiceOption.objects.filter(category__icontains=value).values('pk')
+        )
+
+    def filter_search(self, queryset, name, value):
+        return queryset.filter(search_text__contains=value.strip().lower())
+
+
+class ArchivedOrderFilter(filters.FilterSet):
+    """Те же параметры, что у OrderFilter: названия сервиса и опции в архиве хранятся текстом."""
+    service = filters.CharFilter(field_name="service_name", lookup_expr="icontains", label="Сервис")
+    service_option = filters.CharFilter(field_name="option_name", lookup_expr="icontains", label="Опции сервиса")
+    q = filters.CharFilter(method="filter_search", label="Поиск по сервису и категории")
+
+    class Meta:
+        model = ArchivedOrder
+        fields = ["id", "service", "service_option", "status", "created_at", "completed", "quantity", "total_price"]
+
+    def filter_search(self, queryset, name, value):
+        # Та же строка, что Order.search_text
+        return queryset.alias(
+            search_text=Lower(Concat('service_name', Value(' '), 'option_name'))
+        ).filter(search_text__contains=value.strip().lower())
+
 
 class OrderGetAllView(ListAPIView):
     serializer_class = OrderGetAllSerializer
-    filter_backends = [filters.DjangoFilterBackend, OrderingFilter]
+    query_budget = 1
+    filter_backends = [filters.DjangoFilterBackend]
     filterset_class = OrderFilter
+    # Сортировка и курсор страницы задаются пагинацией, ключ курсора (поле, id)
+    pagination_class = KeysetPagination
     # Определяем отображение имен для сортировки:
     ordering_fields = {
         "id": "id",
         "service__name": "service__name",
-        "period_order": "period_order",
+        "period_order": "period_rank",
         "quantity": "quantity",
-        "service_option": "service_option__name",
+        "service_option": "service_option__category",
         "status": "status",
         "total_price": "total_price",
         "created_at": "created_at",
         "completed": "completed",
     }
-    ordering = ["-created_at"]
 
     def get_queryset(self):
         user_pk = self.request.user.pk
-        qs = Order.objects.filter(user__pk=user_pk)
-        qs = qs.annotate(
-            period_order=Case(
-                When(service_option__period=ServiceOption.PeriodChoices.HOUR, then=Value(1)),
-                When(service_option__period=ServiceOption.PeriodChoices.DAY, then=Value(2)),
-                When(service_option__period=ServiceOption.PeriodChoices.WEEK, then=Value(3)),
-                When(service_option__period=ServiceOption.PeriodChoices.MONTH, then=Value(4)),
-                output_field=IntegerField()
-            )
-        )
-        return qs
+        # service_option рендерится через __str__, которому нужен service опции
+        return Order.objects.filter(user__pk=user_pk).select_related('service', 'service_option__service')
+
+
+class ArchivedOrderListView(ListAPIView):
+    """Завершённые заказы пользователя, перенесённые командой archive_orders из списка заказов."""
+    serializer_class = ArchivedOrderDetailSerializer
+    query_budget = 1
+    filter_backends = [filters.DjangoFilterBackend]
+    filterset_class = ArchivedOrderFilter
+    pagination_class = KeysetPagination
+    ordering_fields = {
+        "id": "id",
+        "service__name": "service_name",
+        "quantity": "quantity",
+        "service_option": "option_name",
+        "status": "status",
+        "total_price": "total_price",
+        "created_at": "created_at",
+        "completed": "completed",
+    }
+
+    def get_queryset(self):
+        return ArchivedOrder.objects.filter(user=self.request.user)
+
+
+class OrderExportView(GenericAPIView):
+    """
+    Потоковая выгрузка всех заказов пользователя, включая архивные: ?export_format=csv|ndjson.
+    Поддерживает те же фильтры, что и список заказов.
+    """
+    filter_backends = [filters.DjangoFilterBackend]
+    filterset_class = OrderFilter
+
+    def get_queryset(self):
+        return Order.objects.filter(user=self.request.user)
+
+    def get(self, request):
+        queryset = self.filter_queryset(self.get_queryset())
+        archived_queryset = ArchivedOrderFilter(
+            request.query_params, queryset=ArchivedOrder.objects.filter(user=request.user), request=request
+        ).qs
+        export_format = request.query_params.get('export_format', 'csv')
+        if export_format not in EXPORT_FORMATS:
+            return Response({"detail": f"Unsupported export format: {export_format}."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return export_orders_response(queryset, export_format, archived_queryset=archived_queryset)
 
 
 class OrderCreateView(CreateAPIView):
     serializer_class = OrderCreateSerializer
     queryset = Order.objects.all()
 
+    @idempotent
+    def post(self, request, *args, **kwargs):
+        if not self.is_async_intake(request):
+            return self.create(request, *args, **kwargs)
+
+        # Асинхронный приём: проверка и резерв средств в запросе, заказ создаёт process_order_intake
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            intake = queue_order(serializer.validated_data, serializer.pricing)
+        except InsufficientFundsError:
+            return Response({"detail": "You do not have enough money to make a purchase."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return Response(
+            {'id': intake.pk, 'status': OrderIntakeDetailView.QUEUED,
+             'total_price': intake.total_price.amount, 'queued': True},
+            status=status.HTTP_202_ACCEPTED,
+            headers={'Location': reverse('order-intake-detail', args=[intake.pk], request=request)}
+        )
+
+    def is_async_intake(self, request):
+        """Режим включается настройкой ORDER_INTAKE_ASYNC или заголовком Prefer: respond-async."""
+        return settings.ORDER_INTAKE_ASYNC or 'respond-async' in request.headers.get('Prefer', '')
+
     def handle_exception(self, exc):
         response = exception_handler(exc, self.get_renderer_context())
         if response is None:
@@ -90,6 +191,31 @@ class OrderCreateView(CreateAPIView):
             raise serializers.ValidationError({"detail": "Failed to create order. Check the data"})
 
 
+class OrderBatchCreateView(APIView):
+    """
+    Пакетное создание заказов: [{...}, ...] или {"orders": [{...}, ...]}.
+    Сумма валидных позиций списывается одним платежом, ответ содержит результат по каждой позиции.
+    """
+
+    @idempotent
+    def post(self, request):
+        data = {'orders': request.data} if isinstance(request.data, list) else request.data
+        serializer = OrderBatchCreateSerializer(data=data)
+        serializer.is_valid(raise_exception=True)
+        items = serializer.validated_data['orders']
+
+        try:
+            results = create_orders_batch(request.user, items)
+        except InsufficientFundsError:
+            return Response({"detail": "You do not have enough money to make a purchase."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        created = sum(1 for result in results if result['status'] == 'created')
+        logger.info(f"Пакетный заказ: создано {created} из {len(items)}, пользователь {request.user}")
+        return Response({'results': results},
+                        status=status.HTTP_201_CREATED if created else status.HTTP_400_BAD_REQUEST)
+
+
 class ReplenishmentBalanceCreateView(CreateAPIView):
     serializer_class = ReplenishmentBalanceCreateSerializer
     queryset = ReplenishmentBalance
@@ -102,6 +228,10 @@ class OrderDetailView(APIView):
             # Пытаемся получить заказ по id
             order = Order.objects.get(pk=id_order, user=request.user)
         except Order.DoesNotExist:
+            # Старые завершённые заказы перенесены в архив командой archive_orders
+            archived_order = ArchivedOrder.objects.filter(pk=id_order, user=request.user).first()
+            if archived_order is not None:
+                return Response(ArchivedOrderDetailSerializer(archived_order).data, status=status.HTTP_200_OK)
             logger.error(f"Заказ с ID={id_order} не найден или недоступен пользователю {request.user}.")
             return Response({"detail": f"Order with ID={id_order} not found."}, status=status.HTTP_404_NOT_FOUND)
         except Exception as e:
@@ -112,3 +242,25 @@ class OrderDetailView(APIView):
         # Сериализуем и возвращаем данные заказа
         serializer = OrderDetailSerializer(order)
         return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class OrderIntakeDetailView(APIView):
+    """
+    Статус заказа, принятого с ответом 202: queued, пока его не создал process_order_intake,
+    затем created с id заказа и ссылкой на него в Location.
+    """
+    QUEUED = 'queued'
+    CREATED = 'created'
+
+    def get(self, request, id_intake):
+        intake = OrderIntake.objects.filter(pk=id_intake, user=request.user).values('order_id').first()
+        if intake is None:
+            return Response({"detail": f"Order intake with ID={id_intake} not found."},
+                            status=status.HTTP_404_NOT_FOUND)
+        if intake['order_id'] is None:
+            return Response({'id': id_intake, 'status': self.QUEUED}, status=status.HTTP_200_OK)
+        return Response(
+            {'id': id_intake, 'status': self.CREATED, 'order_id': intake['order_id']},
+            status=status.HTTP_200_OK,
+            headers={'Location': reverse('order-detail', args=[intake['order_id']], request=request)}
+        )
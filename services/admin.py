@@ -1,39 +1,26 @@
-import re
-
-from .forms import ServiceOptionAdminForm
-from django.utils.safestring import mark_safe
-from .models import Service, ServiceOption, RequiredField, PointsServiceOption, PopularServiceOption
+from .forms import PriceTierInlineFormSet, ServiceOptionAdminForm
+from django.utils.html import format_html
+from .icons import get_preview_url
+from .models import Service, ServiceOption, RequiredField, PointsServiceOption, PopularServiceOption, \
+    PriceTier, ServiceOptionPopularity
+from .popularity import current_score
 from django.contrib import admin
 
 
+def icon_preview_html(service):
+    """Превью по готовому файлу иконки: без разбора SVG при каждой отрисовке списка."""
+    url = get_preview_url(service.icon_assets)
+    if url:
+        return format_html('<img src="{}" width="40" height="40" style="object-fit: contain;" />', url)
+    return '-'
+
+
 class ServiceAdmin(admin.ModelAdmin):
-    list_display = ('name', 'icon_service_preview', 'icon_svg_preview', 'created_at')
-
-    def icon_svg_preview(self, obj):
-        if obj.icon_svg:
-            svg_code = obj.icon_svg
-            cleaned_svg = re.sub(r'width="\d+px?"|height="\d+px?"', '', svg_code)  # Убираем width и height
-
-            return mark_safe(
-                f'''
-                    <div style="width: 40px; height: 40px; display: flex; align-items: center; justify-content: center;">
-                        <svg width="40" height="40" viewBox="0 0 512 512" preserveAspectRatio="xMidYMid meet" 
-                             xmlns="http://www.w3.org/2000/svg">
-                            {cleaned_svg}
-                        </svg>
-                    </div>
-                    '''
-            )
-        return '-'
-
-    def icon_service_preview(self, obj):
-        if obj.icon_service:
-            return mark_safe(
-                f'<img src="{obj.icon_service.url}" width="40" height="40" style="object-fit: contain;" />')
-        return '-'
-
-    icon_service_preview.short_description = 'Иконка'
-    icon_svg_preview.short_description = 'Иконка'
+    list_display = ('name', 'icon_preview', 'created_at')
+
+    @admin.display(description='Иконка')
+    def icon_preview(self, obj):
+        return icon_preview_html(obj)
 
 
 admin.site.register(Service, ServiceAdmin)
@@ -41,13 +28,21 @@ admin.site.register(RequiredField)
 admin.site.register(PointsServiceOption)
 
 
+class PriceTierInline(admin.TabularInline):
+    model = PriceTier
+    formset = PriceTierInlineFormSet
+    extra = 0
+
+
 class ServiceOptionAdmin(admin.ModelAdmin):
     form = ServiceOptionAdminForm
+    inlines = [PriceTierInline]
     search_fields = [
         'service__name', 'category', 'price_per_unit',
         'period', 'is_interval_required', 'interval'
     ]
     list_filter = ['is_interval_required']
+    list_select_related = ['service']
 
     def get_fields(self, request, obj=None):
         fields = super().get_fields(request, obj)
@@ -60,37 +55,31 @@ class ServiceOptionAdmin(admin.ModelAdmin):
 
 @admin.register(PopularServiceOption)
 class PopularServiceOptionAdmin(admin.ModelAdmin):
-    list_display = ('service_option', 'icon_service_preview', 'icon_svg_preview', 'created_at')
+    list_display = ('service_option', 'icon_preview', 'created_at')
+    list_select_related = ('service_option__service',)
     search_fields = ('service_option__category', 'service_option__service__name')
 
-    def icon_service_preview(self, obj):
-        """Отображение загруженного изображения (icon_service)"""
-        if obj.service_option.service.icon_service:
-            return mark_safe(
-                f'<img src="{obj.service_option.service.icon_service.url}" width="40" height="40" style="object-fit: contain;" />'
-            )
-        return '-'
-
-    def icon_svg_preview(self, obj):
-        """Отображение SVG-кода"""
-        if obj.service_option.service.icon_svg:
-            svg_code = obj.service_option.service.icon_svg
-            cleaned_svg = re.sub(r'width="\d+px?"|height="\d+px?"', '', svg_code)  # Убираем width и height
-
-            return mark_safe(
-                f'''
-                    <div style="width: 40px; height: 40px; display: flex; align-items: center; justify-content: center;">
-                        <svg width="40" height="40" viewBox="0 0 512 512" preserveAspectRatio="xMidYMid meet" 
-                             xmlns="http://www.w3.org/2000/svg">
-                            {cleaned_svg}
-                        </svg>
-                    </div>
-                    '''
-            )
-        return '-'
-
-    icon_service_preview.short_description = 'Иконка (изображение)'
-    icon_svg_preview.short_description = 'Иконка (SVG)'
+    @admin.display(description='Иконка')
+    def icon_preview(self, obj):
+        return icon_preview_html(obj.service_option.service)
 
 
 admin.site.register(ServiceOption, ServiceOptionAdmin)
+
+
+@admin.register(ServiceOptionPopularity)
+class ServiceOptionPopularityAdmin(admin.ModelAdmin):
+    list_display = ('service_option', 'current_score_display', 'updated_at')
+    list_select_related = ('service_option__service',)
+    ordering = ('-score',)
+    search_fields = ('service_option__category', 'service_option__service__name')
+
+    @admin.display(description='Текущий рейтинг', ordering='score')
+    def current_score_display(self, obj):
+        return round(current_score(obj.score), 2)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -5,3 +5,6 @@ class ServicesConfig(AppConfig):
     verbose_name = 'Сервисы'
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'services'
+
+    def ready(self):
+        from . import signals, popularity  # type: ignore
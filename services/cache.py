@@ -0,0 +1,156 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import cache
+
+# Группы ключей каталога, у каждой своя версия
+SERVICES = 'services'
+CATEGORIES = 'categories'
+OPTIONS = 'options'
+POPULAR = 'popular'
+# Скомпилированные таблицы объёмных скидок (services/tiers.py)
+PRICE_TIERS = 'price_tiers'
+# Индивидуальные скидки пользователей: в кэше каталога не хранятся, но входят в ETag списка опций
+DISCOUNTS = 'discounts'
+
+CATALOG_TIMEOUT = 60 * 60 * 24
+# Как долго процесс доверяет закэшированному номеру версии, не спрашивая Redis
+VERSION_LOCAL_TTL = 5
+LOCAL_MAX_SIZE = 512
+# Защита от одновременной пересборки одного ключа несколькими процессами
+BUILD_LOCK_TIMEOUT = 10
+BUILD_WAIT_INTERVAL = 0.05
+BUILD_WAIT_ATTEMPTS = 40
+
+MISSING = object()
+
+
+class LocalLRU:
+    """Кэш процесса с вытеснением давно не использованных ключей."""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=MISSING):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                return default
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_local = LocalLRU(LOCAL_MAX_SIZE)
+_versions = {}
+
+
+def _version_key(group):
+    return f'catalog:version:{group}'
+
+
+def get_catalog_version(group):
+    """
+    Текущая версия группы. Номер запоминается в процессе на VERSION_LOCAL_TTL секунд,
+    поэтому другие процессы видят инвалидацию с задержкой не больше этого времени.
+    """
+    now = time.monotonic()
+    cached = _versions.get(group)
+    if cached is not None and cached[1] > now:
+        return cached[0]
+
+    version = cache.get(_version_key(group))
+    if version is None:
+        # Начальная версия от времени: если ключ версии вытеснен из Redis, старые данные не всплывут
+        cache.add(_version_key(group), int(time.time() * 1000), timeout=None)
+        version = cache.get(_version_key(group))
+    _versions[group] = (version, now + VERSION_LOCAL_TTL)
+    return version
+
+
+def bump_catalog_version(*groups):
+    """Инвалидирует группы: все ключи старой версии перестают читаться и истекают сами."""
+    for group in groups:
+        key = _version_key(group)
+        try:
+            version = cache.incr(key)
+        except ValueError:
+            version = int(time.time() * 1000)
+            cache.set(key, version, timeout=None)
+        _versions[group] = (version, time.monotonic() + VERSION_LOCAL_TTL)
+
+
+def _build_with_lock(key, builder):
+    lock_key = f'{key}:lock'
+    if cache.add(lock_key, 1, timeout=BUILD_LOCK_TIMEOUT):
+        try:
+            value = builder()
+            cache.set(key, value, timeout=CATALOG_TIMEOUT)
+            return value
+        finally:
+            cache.delete(lock_key)
+
+    # Значение уже строит другой процесс - ждём его, а не идём в БД всей толпой
+    for _ in range(BUILD_WAIT_ATTEMPTS):
+        time.sleep(BUILD_WAIT_INTERVAL)
+        value = cache.get(key, MISSING)
+        if value is not MISSING:
+            return value
+    return builder()
+
+
+def get_catalog(group, suffix, builder, version=None):
+    """
+    Значение каталога из кэша процесса, затем из Redis, затем из builder().
+    builder должен возвращать данные, пригодные для pickle (списки, словари, строки).
+    Возвращаемое значение общее для всех запросов процесса - его нельзя изменять.
+    version передаётся, если builder зашивает версию в значение: ключ и данные тогда не разойдутся.
+    """
+    if version is None:
+        version = get_catalog_version(group)
+    key = f'catalog:{group}:{version}:{suffix}'
+    value = _local.get(key)
+    if value is not MISSING:
+        return value
+
+    value = cache.get(key, MISSING)
+    if value is MISSING:
+        value = _build_with_lock(key, builder)
+    _local.set(key, value)
+    return value
+
+
+def catalog_etag(*groups, per_user=False, variant=None):
+    """
+    Функция для django.views.decorators.http.etag: сильный ETag из версий групп каталога.
+    Не обращается к БД, поэтому ответ 304 на If-None-Match обходится без запросов и сериализации.
+    variant(request) - часть ответа, от которой зависят его байты (например, Content-Encoding):
+    сильный ETag у разных байтов должен различаться.
+    """
+
+    def get_etag(request, *args, **kwargs):
+        parts = [str(get_catalog_version(group)) for group in groups]
+        if per_user:
+            parts.append(str(request.user.pk))
+        if variant is not None:
+            parts.append(variant(request))
+        # Один URL может отдаваться в JSON и в browsable API
+        renderer = getattr(request, 'accepted_renderer', None)
+        if renderer is not None:
+            parts.append(renderer.format)
+        return '"' + '-'.join(parts) + '"'
+
+    return get_etag
@@ -0,0 +1,49 @@
+from .discounts import DiscountResolver
+from .models import ServiceOption
+from .pricing import from_basis_points, from_cents, from_micros, line_totals_cents, unit_prices_micros
+from .tiers import get_effective_discount_bp, get_tier_tables
+
+MAX_CART_SIZE = 200
+
+
+def price_cart(user, items):
+    """
+    Цены позиций корзины [{'service_option_id', 'quantity'}, ...] за два запроса:
+    опции и индивидуальные скидки загружаются пачкой, объёмные скидки берутся из кэша.
+    Суммы считаются в центах и округляются так же, как при создании заказа.
+    """
+    option_ids = {item['service_option_id'] for item in items}
+    options = ServiceOption.objects.only(
+        'id', 'price_per_unit', 'price_per_unit_currency', 'discount_percentage'
+    ).in_bulk(option_ids)
+    discounts = DiscountResolver(user, options)
+
+    # Цены и скидки каждой опции переводятся в целые числа один раз, объёмная скидка зависит от количества
+    tables = get_tier_tables()
+    found = [item for item in items if item['service_option_id'] in options]
+    prices = [options[item['service_option_id']].price_cents for item in found]
+    discounts_bp = [
+        get_effective_discount_bp(options[item['service_option_id']],
+                                  discounts.get_user_discount(item['service_option_id']), item['quantity'], tables)
+        for item in found
+    ]
+    unit_prices = unit_prices_micros(prices, discounts_bp)
+    line_totals = line_totals_cents(prices, discounts_bp, [item['quantity'] for item in found])
+
+    priced = iter(zip(discounts_bp, unit_prices, line_totals))
+    lines = []
+    for item in items:
+        if item['service_option_id'] not in options:
+            lines.append({'service_option_id': item['service_option_id'], 'quantity': item['quantity'],
+                          'detail': "Service option not found."})
+            continue
+
+        discount_bp, unit_price, line_total = next(priced)
+        lines.append({
+            'service_option_id': item['service_option_id'],
+            'quantity': item['quantity'],
+            'discount_percentage': from_basis_points(discount_bp),
+            'unit_price': from_micros(unit_price, places=4),
+            'total_price': from_cents(line_total),
+        })
+    return {'items': lines, 'total_price': from_cents(sum(line_totals))}
@@ -0,0 +1,43 @@
+import gzip
+import json
+
+from rest_framework.utils.encoders import JSONEncoder
+
+from .cache import OPTIONS, get_catalog, get_catalog_version
+from .models import Service, ServiceOption
+from .serializers import ServiceListSerializer, ServiceOptionSerializer
+
+
+def build_catalog_tree():
+    """Дерево сервисы -> категории -> опции с ценами без индивидуальных скидок (4 запроса)."""
+    services = {service['id']: dict(service, categories=[])
+                for service in ServiceListSerializer(Service.objects.defer('icon_svg').order_by('id'), many=True).data}
+    options = (
+        ServiceOption.objects.select_related('service')
+        .prefetch_related('required_field', 'points')
+        .order_by('service_id', 'id')
+    )
+    categories = {}
+    for option in ServiceOptionSerializer(options, many=True).data:
+        key = (option['service_id'], option['category'])
+        if key not in categories:
+            categories[key] = {'name': option['category'], 'options': []}
+            services[option['service_id']]['categories'].append(categories[key])
+        categories[key]['options'].append(option)
+    return list(services.values())
+
+
+def build_catalog_snapshot(version):
+    payload = {'version': version, 'services': build_catalog_tree()}
+    content = json.dumps(payload, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':')).encode()
+    return gzip.compress(content, compresslevel=9)
+
+
+def get_catalog_snapshot():
+    """
+    Весь каталог одним сжатым gzip JSON и его версия. Снимок собирается один раз на версию
+    каталога (любое изменение сервиса, опции или её полей повышает версию OPTIONS) и общий
+    для всех пользователей. Версия читается один раз: по ней строится и ключ кэша, и version в снимке.
+    """
+    version = get_catalog_version(OPTIONS)
+    return version, get_catalog(OPTIONS, 'snapshot', lambda: build_catalog_snapshot(version), version=version)
@@ -0,0 +1,25 @@
+from users.models import UserServiceDiscount
+
+
+class DiscountResolver:
+    """
+    Индивидуальные скидки пользователя для набора опций, загруженные одним запросом.
+    Заменяет ServiceOption.get_user_discount (запрос на каждую опцию) в списках и пакетных расчётах.
+    """
+
+    def __init__(self, user, option_ids):
+        self.discounts = {}
+        option_ids = set(option_ids)
+        if option_ids and user is not None and user.is_authenticated:
+            self.discounts = dict(
+                UserServiceDiscount.objects.filter(user=user, service_option_id__in=option_ids)
+                .values_list('service_option_id', 'discount_percentage')
+            )
+
+    def get_user_discount(self, option_id):
+        """Индивидуальная скидка на опцию или 0, если её нет."""
+        return self.discounts.get(option_id, 0)
+
+    def get_discount_percentage(self, service_option):
+        """Итоговая скидка: большая из скидки опции и индивидуальной."""
+        return max(service_option.discount_percentage, self.get_user_discount(service_option.pk))
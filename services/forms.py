@@ -1,5 +1,6 @@
 from django import forms
 from django.core.exceptions import ValidationError
+from django.forms.models import BaseInlineFormSet
 from djmoney.money import Money
 
 from .models import ServiceOption
@@ -16,3 +17,22 @@ class ServiceOptionAdminForm(forms.ModelForm):
             raise ValidationError('Цена за штуку не должна быть меньше 0 или ровна 0')
         return price
 
+
+class PriceTierInlineFormSet(BaseInlineFormSet):
+    """Скидка не должна уменьшаться с ростом количества: больший заказ не может стоить дороже за единицу."""
+
+    def clean(self):
+        super().clean()
+        tiers = sorted(
+            (form.cleaned_data['min_quantity'], form.cleaned_data['discount_percentage'])
+            for form in self.forms
+            if form.cleaned_data and not form.cleaned_data.get('DELETE')
+            and form.cleaned_data.get('min_quantity') is not None
+            and form.cleaned_data.get('discount_percentage') is not None
+        )
+        for (previous_quantity, previous_discount), (min_quantity, discount) in zip(tiers, tiers[1:]):
+            if discount < previous_discount:
+                raise ValidationError(
+                    f'Скидка от {min_quantity} шт. ({discount}%) меньше скидки от {previous_quantity} шт. '
+                    f'({previous_discount}%)'
+                )
@@ -0,0 +1,182 @@
+import hashlib
+import re
+from io import BytesIO
+from xml.etree import ElementTree
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, UnidentifiedImageError
+
+# Файлы с хэшем содержимого в имени не меняются, nginx отдаёт их с immutable-кэшированием
+ICONS_DIR = 'service_icons'
+# Размеры миниатюр в пикселях: 1x и 2x для превью 40-64px
+ICON_SIZES = (64, 128)
+ICON_FORMATS = {
+    'webp': {'format': 'WEBP', 'quality': 90, 'method': 6},
+    'png': {'format': 'PNG', 'optimize': True},
+}
+MAX_SVG_LENGTH = 200_000
+# Так загруженные фрагменты отрисовывала админка, когда SVG хранился без корневого тега
+DEFAULT_VIEWBOX = '0 0 512 512'
+
+SVG_NS = 'http://www.w3.org/2000/svg'
+XLINK_NS = 'http://www.w3.org/1999/xlink'
+ElementTree.register_namespace('', SVG_NS)
+ElementTree.register_namespace('xlink', XLINK_NS)
+
+# Только элементы отрисовки: script, foreignObject, style, image и метаданные редакторов отбрасываются
+ALLOWED_SVG_TAGS = frozenset({
+    'svg', 'g', 'defs', 'symbol', 'use', 'path', 'rect', 'circle', 'ellipse', 'line', 'polyline', 'polygon',
+    'text', 'tspan', 'linearGradient', 'radialGradient', 'stop', 'clipPath', 'mask', 'pattern',
+})
+HREF_ATTRIBUTES = ('href', f'{{{XLINK_NS}}}href')
+DIMENSION_RE = re.compile(r'^\s*(\d+(?:\.\d+)?)(?:px)?\s*$')
+
+
+def _content_name(content, suffix):
+    digest = hashlib.sha256(content).hexdigest()[:16]
+    return f'{ICONS_DIR}/{digest}{suffix}'
+
+
+def _store(content, suffix):
+    """Сохраняет файл под именем из хэша содержимого. Одинаковые файлы не пишутся повторно."""
+    name = _content_name(content, suffix)
+    if not default_storage.exists(name):
+        default_storage.save(name, ContentFile(content))
+    return name
+
+
+def _parse_svg(svg_code):
+    try:
+        root = ElementTree.fromstring(svg_code)
+    except ElementTree.ParseError:
+        root = None
+    if root is None or root.tag.rsplit('}', 1)[-1] != 'svg':
+        # Фрагмент без корневого <svg> - оборачиваем так же, как его показывала админка
+        try:
+            root = ElementTree.fromstring(f'<svg xmlns="{SVG_NS}" viewBox="{DEFAULT_VIEWBOX}">{svg_code}</svg>')
+        except ElementTree.ParseError:
+            raise ValueError({"detail": "Invalid SVG icon."})
+    return root
+
+
+def _clean_element(element):
+    element.tag = f'{{{SVG_NS}}}{element.tag.rsplit("}", 1)[-1]}'
+    for name in list(element.attrib):
+        value = element.attrib[name]
+        if name in HREF_ATTRIBUTES:
+            # Только ссылки внутри документа: внешние ресурсы и javascript: не допускаются
+            if not value.strip().startswith('#'):
+                del element.attrib[name]
+        elif name.startswith('{') or name.lower().startswith('on'):
+            # Обработчики событий и атрибуты чужих пространств имён (inkscape, sodipodi)
+            del element.attrib[name]
+        elif 'javascript:' in value.lower() or ('url(' in value.lower() and 'url(#' not in value.lower()):
+            del element.attrib[name]
+
+    for child in list(element):
+        if not isinstance(child.tag, str) or child.tag.rsplit('}', 1)[-1] not in ALLOWED_SVG_TAGS:
+            element.remove(child)
+            continue
+        _clean_element(child)
+
+    # Минификация: пробелы между тегами не влияют на отрисовку
+    if element.text is not None and not element.text.strip():
+        element.text = None
+    for child in element:
+        child.tail = None
+
+
+def sanitize_svg(svg_code):
+    """
+    Очищенный и минифицированный SVG с корневым тегом и viewBox.
+    Повторный вызов на результате возвращает его без изменений.
+    """
+    svg_code = svg_code.strip()
+    if len(svg_code) > MAX_SVG_LENGTH:
+        raise ValueError({"detail": "SVG icon is too large."})
+    if '<!DOCTYPE' in svg_code or '<!ENTITY' in svg_code:
+        raise ValueError({"detail": "SVG icon must not contain DOCTYPE or entity declarations."})
+
+    root = _parse_svg(svg_code)
+    _clean_element(root)
+
+    # Размер задаёт вёрстка, а пропорции - viewBox
+    width, height = root.attrib.pop('width', None), root.attrib.pop('height', None)
+    if 'viewBox' not in root.attrib:
+        width_match, height_match = DIMENSION_RE.match(width or ''), DIMENSION_RE.match(height or '')
+        if width_match and height_match:
+            root.set('viewBox', f'0 0 {width_match.group(1)} {height_match.group(1)}')
+        else:
+            root.set('viewBox', DEFAULT_VIEWBOX)
+    return ElementTree.tostring(root, encoding='unicode')
+
+
+def build_thumbnails(image_file):
+    """Миниатюры изображения во всех форматах: {'webp': {'64': имя файла, ...}, 'png': {...}}."""
+    try:
+        with image_file.open('rb') as source:
+            image = Image.open(source)
+            image.load()
+    except (UnidentifiedImageError, OSError):
+        raise ValueError({"detail": "Invalid icon image."})
+
+    image = image.convert('RGBA')
+    thumbnails = {ext: {} for ext in ICON_FORMATS}
+    for size in ICON_SIZES:
+        thumbnail = image.copy()
+        thumbnail.thumbnail((size, size), Image.LANCZOS)
+        for ext, options in ICON_FORMATS.items():
+            buffer = BytesIO()
+            thumbnail.save(buffer, **options)
+            thumbnails[ext][str(size)] = _store(buffer.getvalue(), f'-{size}.{ext}')
+    return thumbnails
+
+
+def build_icon_assets(image_file, svg_code, previous=None):
+    """
+    Файлы иконки сервиса: очищенный SVG и миниатюры изображения, с хэшем содержимого в имени.
+    svg_code уже должен быть очищен sanitize_svg. Миниатюры пересобираются только при смене
+    файла изображения, остальное берётся из previous.
+    """
+    previous = previous or {}
+    assets = {}
+    if svg_code:
+        assets['svg'] = _store(svg_code.encode(), '.svg')
+    if image_file:
+        if previous.get('image') == image_file.name and previous.get('thumbnails'):
+            assets['thumbnails'] = previous['thumbnails']
+        else:
+            assets['thumbnails'] = build_thumbnails(image_file)
+        assets['image'] = image_file.name
+    return assets
+
+
+def get_icon_urls(assets):
+    """URL файлов иконки для API: {'svg': url или None, 'webp': {'64': url, ...}, 'png': {...}}."""
+    assets = assets or {}
+    thumbnails = assets.get('thumbnails', {})
+    urls = {'svg': default_storage.url(assets['svg']) if assets.get('svg') else None}
+    for ext in ICON_FORMATS:
+        urls[ext] = {size: default_storage.url(name) for size, name in thumbnails.get(ext, {}).items()}
+    return urls
+
+
+def get_preview_url(assets):
+    """Небольшая иконка для списков в админке: SVG, если есть, иначе минимальная миниатюра."""
+    urls = get_icon_urls(assets)
+    if urls['svg']:
+        return urls['svg']
+    webp = urls['webp']
+    return webp[str(min(map(int, webp)))] if webp else None
+
+
+def referenced_icon_files(assets_list):
+    """Имена всех файлов, на которые ссылаются переданные наборы иконок."""
+    names = set()
+    for assets in assets_list:
+        if assets.get('svg'):
+            names.add(assets['svg'])
+        for files in assets.get('thumbnails', {}).values():
+            names.update(files.values())
+    return names
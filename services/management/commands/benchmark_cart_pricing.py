@@ -0,0 +1,61 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from services.models import ServiceOption
+from services.views import CalculateCartPriceView
+from users.models import CustomerUser
+
+
+class Command(BaseCommand):
+    help = ('Замер серверного времени POST calculate-price/batch/ на существующих опциях и пользователе: '
+            'медиана, p95 и число SQL-запросов на корзину. Данные в БД не изменяются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lines', type=int, default=50, help='Позиций в корзине')
+        parser.add_argument('--iterations', type=int, default=200, help='Количество замеров')
+        parser.add_argument('--email', help='Пользователь, для которого считаются скидки (по умолчанию первый)')
+
+    def handle(self, *args, **options):
+        option_ids = list(ServiceOption.objects.order_by('id').values_list('id', flat=True)[:options['lines']])
+        if not option_ids:
+            raise CommandError('В базе нет опций сервисов')
+        users = CustomerUser.objects.all()
+        user = users.filter(email=options['email']).first() if options['email'] else users.order_by('id').first()
+        if user is None:
+            raise CommandError('Пользователь не найден')
+
+        # Опций может быть меньше, чем позиций - повторяем их по кругу
+        items = [{'service_option_id': option_ids[i % len(option_ids)], 'quantity': i + 1}
+                 for i in range(options['lines'])]
+        factory = APIRequestFactory()
+        view = CalculateCartPriceView.as_view()
+
+        def call():
+            request = factory.post('/api/v1/service/calculate-price/batch/', items, format='json')
+            force_authenticate(request, user=user)
+            response = view(request)
+            response.render()
+            return response
+
+        with CaptureQueriesContext(connection) as context:
+            response = call()
+        if response.status_code != 200:
+            raise CommandError(f'Ответ {response.status_code}: {response.content[:200]}')
+
+        timings = []
+        for _ in range(options['iterations']):
+            started = time.perf_counter()
+            call()
+            timings.append((time.perf_counter() - started) * 1000)
+
+        timings.sort()
+        p95 = timings[max(int(len(timings) * 0.95) - 1, 0)]
+        self.stdout.write(
+            f'Позиций: {len(items)}, замеров: {len(timings)}, SQL-запросов: {len(context.captured_queries)}\n'
+            f'Медиана: {statistics.median(timings):.2f} мс, p95: {p95:.2f} мс, максимум: {timings[-1]:.2f} мс'
+        )
@@ -0,0 +1,71 @@
+import random
+import statistics
+import time
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.core.management.base import BaseCommand
+from djmoney.money import Money
+
+from services.pricing import from_cents, line_totals_cents, to_basis_points, to_cents
+
+CENT = Decimal('0.01')
+
+
+def legacy_line_total(price, option_discount, user_discount, quantity):
+    """Прежний расчёт: Decimal и Money на каждую позицию."""
+    discount = max(user_discount, option_discount)
+    unit_price = Money(price, currency="USD").amount * Decimal(1 - discount / 100)
+    return Money((unit_price * quantity).quantize(CENT, ROUND_HALF_UP), currency="USD")
+
+
+class Command(BaseCommand):
+    help = ('Микробенчмарк расчёта цен каталога: прежний путь через Decimal/Money против целочисленного '
+            'пакетного расчёта в центах. Работает на синтетических данных, БД не использует.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--options', type=int, default=1000, help='Опций в каталоге')
+        parser.add_argument('--iterations', type=int, default=50, help='Количество замеров')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def measure(self, func, iterations):
+        timings = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
+
+    def handle(self, *args, **options):
+        rnd = random.Random(options['seed'])
+        count = options['options']
+        prices = [Decimal(rnd.randint(1, 100000)).scaleb(-2) for _ in range(count)]
+        option_discounts = [Decimal(rnd.choice((0, 500, 1000, 1250, 3333))).scaleb(-2) for _ in range(count)]
+        user_discounts = [Decimal(rnd.choice((0, 0, 750, 1500))).scaleb(-2) for _ in range(count)]
+        quantities = [rnd.randint(1, 100000) for _ in range(count)]
+
+        def legacy():
+            return [legacy_line_total(*row) for row in zip(prices, option_discounts, user_discounts, quantities)]
+
+        # Перевод в целые числа делается один раз при загрузке опций, в замер входит только расчёт
+        prices_cents = [to_cents(price) for price in prices]
+        discounts_bp = [max(to_basis_points(option_discount), to_basis_points(user_discount))
+                        for option_discount, user_discount in zip(option_discounts, user_discounts)]
+
+        def integer():
+            return line_totals_cents(prices_cents, discounts_bp, quantities)
+
+        def integer_with_money():
+            return [Money(from_cents(total), currency="USD") for total in integer()]
+
+        mismatches = sum(
+            old.amount != from_cents(new) for old, new in zip(legacy(), integer())
+        )
+        legacy_ms = self.measure(legacy, options['iterations'])
+        integer_ms = self.measure(integer, options['iterations'])
+        boundary_ms = self.measure(integer_with_money, options['iterations'])
+        self.stdout.write(
+            f'Опций: {count}, замеров: {options["iterations"]}, расхождений сумм: {mismatches}\n'
+            f'Decimal/Money: {legacy_ms:.3f} мс\n'
+            f'Целые центы: {integer_ms:.3f} мс ({legacy_ms / integer_ms:.0f}x)\n'
+            f'Целые центы + Money на выходе: {boundary_ms:.3f} мс ({legacy_ms / boundary_ms:.1f}x)'
+        )
@@ -0,0 +1,41 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from services.icons import ICONS_DIR, referenced_icon_files
+from services.models import Service
+
+
+class Command(BaseCommand):
+    help = ('Очищает SVG и собирает миниатюры иконок для сервисов, у которых их ещё нет. '
+            'Новые и изменённые иконки обрабатываются при сохранении сервиса.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Пересобрать иконки всех сервисов')
+        parser.add_argument('--prune', action='store_true',
+                            help='Удалить файлы иконок, на которые не ссылается ни один сервис')
+
+    def handle(self, *args, **options):
+        built = 0
+        for service in Service.objects.order_by('id'):
+            if service.icon_assets and not options['force']:
+                continue
+            if options['force']:
+                service.icon_assets = {}
+            try:
+                service.save(update_fields=['icon_svg', 'icon_assets'])
+            except ValueError as e:
+                self.stderr.write(f'{service.name} (id={service.pk}): {e}')
+                continue
+            built += 1
+        self.stdout.write(self.style.SUCCESS(f'Собраны иконки сервисов: {built}'))
+
+        if options['prune']:
+            used = referenced_icon_files(Service.objects.values_list('icon_assets', flat=True))
+            _, files = default_storage.listdir(ICONS_DIR)
+            removed = 0
+            for name in files:
+                path = f'{ICONS_DIR}/{name}'
+                if path not in used:
+                    default_storage.delete(path)
+                    removed += 1
+            self.stdout.write(self.style.SUCCESS(f'Удалено неиспользуемых файлов: {removed}'))
@@ -0,0 +1,41 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from orders.models import Order
+from services.models import ServiceOptionPopularity
+from services.popularity import add_orders_to_popularity
+
+CHUNK_SIZE = 5000
+
+
+class Command(BaseCommand):
+    help = ('Пересобирает рейтинг популярных опций по заказам за последние дни. Нужен один раз для '
+            'начального заполнения, дальше рейтинг обновляется обработчиком outbox по новым заказам.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=90, help='За сколько дней учитывать заказы')
+
+    def handle(self, *args, **options):
+        since = timezone.now() - timedelta(days=options['days'])
+        ServiceOptionPopularity.objects.all().delete()
+
+        rows = (
+            Order.objects.filter(created_at__gte=since)
+            .order_by('id')
+            .values_list('service_option_id', 'created_at', 'total_price')
+            .iterator(chunk_size=CHUNK_SIZE)
+        )
+        chunk = []
+        total = 0
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= CHUNK_SIZE:
+                add_orders_to_popularity(chunk)
+                total += len(chunk)
+                chunk = []
+        if chunk:
+            add_orders_to_popularity(chunk)
+            total += len(chunk)
+        self.stdout.write(self.style.SUCCESS(f'Учтено заказов: {total}'))
@@ -1,15 +1,39 @@
-from decimal import Decimal
-
+from django.core.exceptions import ValidationError
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
 from djmoney.models.fields import MoneyField
 
+from .icons import build_icon_assets, sanitize_svg
+from .pricing import from_micros, to_basis_points, to_cents, unit_price_micros
+
 
 class Service(models.Model):
     name = models.CharField(max_length=255, verbose_name="Название сервиса")  # Название сервиса (YouTube, VK и т.д.)
     icon_service = models.ImageField(upload_to='service_images/', null=True, blank=True, verbose_name="Изображение")
     icon_svg = models.TextField(null=True, blank=True, verbose_name="SVG")
+    # Очищенный SVG и миниатюры изображения с хэшем содержимого в имени, заполняется в save()
+    icon_assets = models.JSONField(default=dict, blank=True, editable=False, verbose_name="Файлы иконки")
     created_at = models.DateTimeField(auto_now_add=True)
 
+    def clean(self):
+        if self.icon_svg:
+            try:
+                sanitize_svg(self.icon_svg)
+            except ValueError:
+                raise ValidationError({'icon_svg': 'Некорректный SVG'})
+
+    def save(self, *args, **kwargs):
+        if self.icon_service and not self.icon_service._committed:
+            # Загрузка сохраняется заранее, чтобы миниатюры строились по окончательному имени файла
+            self.icon_service.save(self.icon_service.name, self.icon_service.file, save=False)
+        if self.icon_svg:
+            self.icon_svg = sanitize_svg(self.icon_svg)
+        self.icon_assets = build_icon_assets(self.icon_service, self.icon_svg, self.icon_assets)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'icon_svg', 'icon_assets'}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return self.name
 
@@ -18,6 +42,29 @@ class Service(models.Model):
         verbose_name_plural = "Сервисы"
 
 
+class Category(models.Model):
+    """
+    Категория опций внутри сервиса. Создаётся и удаляется автоматически по строке
+    ServiceOption.category, выборки по ней идут по индексу (service, name).
+    """
+    service = models.ForeignKey(Service, related_name='categories', on_delete=models.CASCADE,
+                                verbose_name="Сервис")
+    name = models.CharField(max_length=255, verbose_name="Название")
+
+    @classmethod
+    def delete_if_unused(cls, category_id):
+        """Удаляет категорию, если в ней не осталось опций."""
+        cls.objects.filter(pk=category_id, options__isnull=True).delete()
+
+    def __str__(self):
+        return self.name
+
+    class Meta:
+        verbose_name = "Категория"
+        verbose_name_plural = "Категории"
+        unique_together = ('service', 'name')
+
+
 class ServiceOption(models.Model):
     class PeriodChoices(models.Choices):
         HOUR = 'Hour'
@@ -30,6 +77,9 @@ class ServiceOption(models.Model):
                                 verbose_name="Название сервиса")
 
     category = models.CharField(max_length=255, verbose_name="Категория")
+    # Заполняется в save() по строке category
+    service_category = models.ForeignKey(Category, related_name='options', on_delete=models.SET_NULL,
+                                         null=True, blank=True, editable=False, verbose_name="Категория (запись)")
     price_per_unit = MoneyField(max_digits=15, decimal_places=2,
                                 verbose_name='Цена', default=0,
                                 default_currency="USD")
@@ -86,12 +136,36 @@ class ServiceOption(models.Model):
         """
         Рассчитывает цену с учетом скидки для конкретного пользователя.
         """
-        user_discount_percentage = self.get_user_discount(user)
-        max_discount_percentage = max(user_discount_percentage, self.discount_percentage)
+        return self.calculate_discounted_price(self.get_user_discount(user))
 
-        # Приводим max_discount_percentage к Decimal, чтобы избежать ошибки с умножением
-        discounted_price = self.price_per_unit.amount * Decimal(1 - max_discount_percentage / 100)
-        return discounted_price
+    @property
+    def price_cents(self):
+        return to_cents(self.price_per_unit.amount)
+
+    @property
+    def discount_bp(self):
+        return to_basis_points(self.discount_percentage)
+
+    def get_discount_bp(self, user_discount_percentage):
+        """Итоговая скидка в сотых долях процента: большая из скидки опции и индивидуальной."""
+        return max(to_basis_points(user_discount_percentage), self.discount_bp)
+
+    def calculate_discounted_price(self, user_discount_percentage):
+        """
+        Точная цена за единицу с учетом уже известной индивидуальной скидки, без запросов к БД.
+        """
+        return from_micros(unit_price_micros(self.price_cents, self.get_discount_bp(user_discount_percentage)))
+
+    def save(self, *args, **kwargs):
+        previous_category_id = self.service_category_id
+        self.service_category, _ = Category.objects.get_or_create(service_id=self.service_id, name=self.category)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'service_category'}
+        super().save(*args, **kwargs)
+
+        if previous_category_id and previous_category_id != self.service_category_id:
+            Category.delete_if_unused(previous_category_id)
 
     def __str__(self):
         return f"{self.category} for {self.service.name}"
@@ -99,6 +173,9 @@ class ServiceOption(models.Model):
     class Meta:
         verbose_name = "Настройки сервиса"
         verbose_name_plural = "Настройки сервисов"
+        indexes = [
+            models.Index(fields=['service', 'service_category'], name='option_service_category_idx'),
+        ]
 
 
 class RequiredField(models.Model):
@@ -123,6 +200,29 @@ class PointsServiceOption(models.Model):
         verbose_name_plural = "Пункты для опций"
 
 
+class PriceTier(models.Model):
+    """
+    Ступень объёмной скидки: от min_quantity единиц в заказе действует discount_percentage.
+    Применяется большая из скидок: опции, индивидуальной и ступени (см. services/tiers.py).
+    """
+    service_option = models.ForeignKey(ServiceOption, related_name='price_tiers', on_delete=models.CASCADE,
+                                       verbose_name="Опция")
+    min_quantity = models.PositiveIntegerField(validators=[MinValueValidator(2)],
+                                               verbose_name="От количества")
+    discount_percentage = models.DecimalField(max_digits=5, decimal_places=2,
+                                              validators=[MinValueValidator(0), MaxValueValidator(100)],
+                                              verbose_name="Скидка (%)")
+
+    def __str__(self):
+        return f"от {self.min_quantity}: -{self.discount_percentage}%"
+
+    class Meta:
+        verbose_name = "Ступень объёмной скидки"
+        verbose_name_plural = "Ступени объёмной скидки"
+        unique_together = ('service_option', 'min_quantity')
+        ordering = ('service_option', 'min_quantity')
+
+
 class PopularServiceOption(models.Model):
     service_option = models.ForeignKey(
         ServiceOption,
@@ -148,3 +248,25 @@ class PopularServiceOption(models.Model):
     class Meta:
         verbose_name = "Популярная услуга"
         verbose_name_plural = "Популярные услуги"
+
+
+class ServiceOptionPopularity(models.Model):
+    """
+    Рейтинг опции по заказам с экспоненциальным затуханием.
+    Счётчики хранятся в масштабе момента POPULARITY_EPOCH (см. services.popularity):
+    новый заказ добавляет вес 2^((t - epoch) / half_life), поэтому старые строки
+    не нужно пересчитывать, а сортировка по score совпадает с сортировкой по текущему рейтингу.
+    """
+    service_option = models.OneToOneField(ServiceOption, primary_key=True, on_delete=models.CASCADE,
+                                          related_name='popularity', verbose_name="Опция")
+    order_score = models.FloatField(default=0, verbose_name="Заказы (с затуханием)")
+    revenue_score = models.FloatField(default=0, verbose_name="Выручка (с затуханием)")
+    score = models.FloatField(default=0, db_index=True, verbose_name="Рейтинг")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Обновлено")
+
+    def __str__(self):
+        return f"Рейтинг: {self.service_option_id}"
+
+    class Meta:
+        verbose_name = "Рейтинг опции"
+        verbose_name_plural = "Рейтинг опций"
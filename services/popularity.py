@@ -0,0 +1,113 @@
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from orders.outbox import ORDER_CREATED, outbox_handler
+from .cache import POPULAR, bump_catalog_version
+from .models import ServiceOption, ServiceOptionPopularity, PopularServiceOption
+from .serializers import PopularOptionSerializer, PopularServiceOptionSerializer
+
+# Веса растут как 2^(недель от эпохи): float хватит примерно на 19 лет, затем эпоху
+# нужно сдвинуть и пересобрать рейтинг командой rebuild_popularity
+POPULARITY_EPOCH = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+# Вклад заказа уменьшается вдвое за это время
+POPULARITY_HALF_LIFE = timedelta(days=7)
+# Сколько весит 1 USD выручки относительно одного заказа
+REVENUE_WEIGHT = 0.1
+POPULAR_LIMIT = 12
+TOP_CACHE_KEY = 'popularity:top'
+
+
+def decay_weight(moment):
+    """Вес события в момент moment в масштабе POPULARITY_EPOCH."""
+    return 2 ** ((moment - POPULARITY_EPOCH) / POPULARITY_HALF_LIFE)
+
+
+def current_score(score, now=None):
+    """Рейтинг с учётом затухания на текущий момент (для отображения)."""
+    return score / decay_weight(now or timezone.now())
+
+
+def get_top_option_ids(limit=POPULAR_LIMIT, exclude=()):
+    return list(
+        ServiceOptionPopularity.objects.exclude(service_option_id__in=exclude)
+        .filter(score__gt=0)
+        .order_by('-score', 'service_option_id')
+        .values_list('service_option_id', flat=True)[:limit]
+    )
+
+
+def get_popular_options():
+    """
+    Закреплённые вручную опции (PopularServiceOption), затем лучшие по рейтингу до POPULAR_LIMIT.
+    Три запроса независимо от размера списка.
+    """
+    pinned_ids = list(PopularServiceOption.objects.order_by('created_at', 'id')
+                      .values_list('service_option_id', flat=True))
+    ranked_ids = get_top_option_ids(max(POPULAR_LIMIT - len(pinned_ids), 0), exclude=pinned_ids)
+    option_ids = list(dict.fromkeys(pinned_ids + ranked_ids))
+    options = ServiceOption.objects.select_related('service').defer('service__icon_svg').in_bulk(option_ids)
+    return list(PopularOptionSerializer(
+        [options[option_id] for option_id in option_ids if option_id in options],
+        many=True, context={'pinned': set(pinned_ids)}
+    ).data)
+
+
+def get_pinned_options():
+    """Только закреплённые вручную опции в прежнем формате popular-services (один запрос)."""
+    return list(PopularServiceOptionSerializer(
+        PopularServiceOption.objects.select_related('service_option__service')
+        .defer('service_option__service__icon_svg').order_by('created_at', 'id'),
+        many=True
+    ).data)
+
+
+def add_orders_to_popularity(orders):
+    """
+    Учитывает заказы (service_option_id, created_at, сумма) в рейтинге: по одной строке
+    на опцию, без пересчёта истории. Кэш популярных сбрасывается, только если изменился топ.
+    """
+    deltas = defaultdict(lambda: [0.0, 0.0])
+    for service_option_id, created_at, total_price in orders:
+        weight = decay_weight(created_at)
+        deltas[service_option_id][0] += weight
+        deltas[service_option_id][1] += weight * float(total_price)
+    if not deltas:
+        return
+
+    now = timezone.now()
+    with transaction.atomic():
+        ServiceOptionPopularity.objects.bulk_create(
+            [ServiceOptionPopularity(service_option_id=option_id) for option_id in deltas],
+            ignore_conflicts=True
+        )
+        rows = list(
+            ServiceOptionPopularity.objects.select_for_update()
+            .filter(service_option_id__in=deltas).order_by('service_option_id')
+        )
+        for row in rows:
+            order_delta, revenue_delta = deltas[row.service_option_id]
+            row.order_score += order_delta
+            row.revenue_score += revenue_delta
+            row.score = row.order_score + REVENUE_WEIGHT * row.revenue_score
+            row.updated_at = now
+        ServiceOptionPopularity.objects.bulk_update(rows, ['order_score', 'revenue_score', 'score', 'updated_at'])
+
+    top = get_top_option_ids()
+    if cache.get(TOP_CACHE_KEY) != top:
+        cache.set(TOP_CACHE_KEY, top, timeout=None)
+        bump_catalog_version(POPULAR)
+
+
+@outbox_handler(ORDER_CREATED)
+def count_order_popularity(payloads):
+    add_orders_to_popularity(
+        (payload['service_option_id'], parse_datetime(payload['created_at']), Decimal(payload['total_price']))
+        # События, записанные до появления рейтинга, не содержат опцию
+        for payload in payloads if payload.get('service_option_id')
+    )
@@ -0,0 +1,67 @@
+"""
+Расчёт цен в целых числах.
+
+Цена за единицу хранится в центах, скидка - в сотых долях процента (базисных пунктах,
+10% = 1000). Цена за единицу со скидкой точно выражается в миллионных долях доллара:
+цена_в_центах * (10000 - скидка) / 10000 цента = цена_в_центах * (10000 - скидка) микродолларов.
+
+Правила округления:
+- сумма позиции считается от точной цены за единицу и округляется до цента один раз,
+  половина - вверх (как хранится Order.total_price);
+- цена за единицу для показа не округляется (discounted_price) или округляется
+  до 0.0001 половиной вверх (расчёт корзины).
+
+Decimal и Money создаются только на границе API функциями from_cents / from_micros.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+
+BASIS_POINTS = 10000
+# Прибавляется перед целочисленным делением на BASIS_POINTS: округление половины вверх
+LINE_HALF = BASIS_POINTS // 2
+
+
+def to_cents(amount):
+    """Сумма в долларах (Decimal с не более чем двумя знаками, как в MoneyField) в центах."""
+    return int(Decimal(amount).scaleb(2).to_integral_value(ROUND_HALF_UP))
+
+
+def to_basis_points(percentage):
+    """Процент скидки (Decimal с двумя знаками или 0) в сотых долях процента."""
+    return int(Decimal(percentage).scaleb(2).to_integral_value(ROUND_HALF_UP))
+
+
+def from_cents(cents):
+    return Decimal(cents).scaleb(-2)
+
+
+def from_basis_points(discount_bp):
+    return Decimal(discount_bp).scaleb(-2)
+
+
+def from_micros(micros, places=6):
+    """Цена в микродолларах в Decimal с places знаками; при places < 6 половина округляется вверх."""
+    step = 10 ** (6 - places)
+    return Decimal((micros + step // 2) // step).scaleb(-places)
+
+
+def unit_price_micros(price_cents, discount_bp):
+    """Точная цена за единицу со скидкой в микродолларах."""
+    return price_cents * (BASIS_POINTS - discount_bp)
+
+
+def line_total_cents(price_cents, discount_bp, quantity):
+    """Сумма позиции в центах с округлением половины вверх."""
+    return (price_cents * (BASIS_POINTS - discount_bp) * quantity + LINE_HALF) // BASIS_POINTS
+
+
+def unit_prices_micros(prices_cents, discounts_bp):
+    """Цены за единицу для списка опций: последовательности цен и скидок одинаковой длины."""
+    return [price * (BASIS_POINTS - discount) for price, discount in zip(prices_cents, discounts_bp)]
+
+
+def line_totals_cents(prices_cents, discounts_bp, quantities):
+    """Суммы позиций в центах для последовательностей цен, скидок и количеств одинаковой длины."""
+    return [
+        (price * (BASIS_POINTS - discount) * quantity + LINE_HALF) // BASIS_POINTS
+        for price, discount, quantity in zip(prices_cents, discounts_bp, quantities)
+    ]
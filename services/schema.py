@@ -0,0 +1,64 @@
+from django.core.cache import cache
+
+from .models import ServiceOption
+
+SCHEMA_CACHE_KEY = 'services:custom-data-schema:{}'
+SCHEMA_CACHE_TIMEOUT = 60 * 60
+
+
+class CustomDataSchema:
+    """
+    Скомпилированный набор обязательных полей опции (RequiredField.title).
+    Проверка custom_data - операции над множеством, без обращений к БД.
+    """
+    __slots__ = ('required',)
+
+    def __init__(self, titles):
+        self.required = frozenset(titles)
+
+    def get_errors(self, custom_data):
+        """Текст ошибки для невалидных данных или None."""
+        if not isinstance(custom_data, dict):
+            return "Custom data must be an object."
+        missing = self.required.difference(
+            key for key, value in custom_data.items()
+            if value is not None and (not isinstance(value, str) or value.strip())
+        )
+        if missing:
+            return f"Missing required fields: {', '.join(sorted(missing))}."
+        return None
+
+
+def _load_titles(option_ids):
+    titles = {option_id: [] for option_id in option_ids}
+    rows = ServiceOption.required_field.through.objects.filter(serviceoption_id__in=option_ids).values_list(
+        'serviceoption_id', 'requiredfield__title'
+    )
+    for option_id, title in rows:
+        titles[option_id].append(title)
+    return titles
+
+
+def get_custom_data_schemas(option_ids):
+    """Схемы для нескольких опций: из кэша, недостающие - одним запросом к БД."""
+    option_ids = set(option_ids)
+    keys = {SCHEMA_CACHE_KEY.format(option_id): option_id for option_id in option_ids}
+    cached = cache.get_many(keys)
+    titles = {keys[key]: value for key, value in cached.items()}
+
+    missing = option_ids.difference(titles)
+    if missing:
+        loaded = _load_titles(missing)
+        cache.set_many({SCHEMA_CACHE_KEY.format(option_id): tuple(value) for option_id, value in loaded.items()},
+                       SCHEMA_CACHE_TIMEOUT)
+        titles.update(loaded)
+
+    return {option_id: CustomDataSchema(value) for option_id, value in titles.items()}
+
+
+def get_custom_data_schema(option_id):
+    return get_custom_data_schemas([option_id])[option_id]
+
+
+def invalidate_custom_data_schemas(option_ids):
+    cache.delete_many([SCHEMA_CACHE_KEY.format(option_id) for option_id in option_ids])
@@ -0,0 +1,132 @@
+import heapq
+import re
+from bisect import bisect_left
+from collections import defaultdict
+
+from .cache import OPTIONS, get_catalog, get_catalog_version
+from .models import ServiceOption
+
+TOKEN_RE = re.compile(r'\w+')
+SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 50
+MAX_QUERY_TERMS = 8
+# Вес совпадения по полю: название сервиса важнее категории, категория важнее пунктов и полей опции
+FIELD_WEIGHTS = {'service': 3, 'category': 2, 'points': 1, 'required_fields': 1}
+# Слово целиком ценится выше, чем совпадение по началу слова
+EXACT_MATCH_FACTOR = 2
+
+# (версия OPTIONS, индекс) процесса
+_index = None
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.casefold().replace('ё', 'е'))
+
+
+class SearchIndex:
+    """
+    Инвертированный индекс опций каталога: токен -> {номер опции: вес}.
+    Токены отсортированы, поэтому слова с заданным началом (ввод по мере набора)
+    находятся двоичным поиском и идут подряд.
+    """
+
+    def __init__(self, documents, tokens, postings):
+        """Данные из index_documents: опции для ответа, отсортированные токены и их вхождения."""
+        self.documents = documents
+        self.tokens = tokens
+        self.postings = postings
+
+    def match_prefix(self, term):
+        """{номер опции: вес} для всех токенов, начинающихся с term. Вес слова целиком умножается здесь же."""
+        start = index = bisect_left(self.tokens, term)
+        while index < len(self.tokens) and self.tokens[index].startswith(term):
+            index += 1
+        if start == index:
+            return {}
+
+        matches = {}
+        for position in range(start, index):
+            factor = EXACT_MATCH_FACTOR if self.tokens[position] == term else 1
+            for doc_id, weight in self.postings[position].items():
+                score = weight * factor
+                if matches.get(doc_id, 0) < score:
+                    matches[doc_id] = score
+        return matches
+
+    def search(self, query, limit=SEARCH_LIMIT):
+        """Опции, в которых каждое слово запроса совпадает со словом или его началом, по убыванию веса."""
+        terms = list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TERMS]
+        if not terms:
+            return []
+
+        scores = None
+        # Сначала самые длинные слова: у них меньше совпадений, и пересечение быстрее сужается
+        for term in sorted(terms, key=len, reverse=True):
+            matches = self.match_prefix(term)
+            if scores is None:
+                scores = matches
+            else:
+                scores = {doc_id: score + matches[doc_id] for doc_id, score in scores.items() if doc_id in matches}
+            if not scores:
+                return []
+
+        return [self.documents[doc_id] for doc_id in heapq.nlargest(limit, scores, key=scores.__getitem__)]
+
+
+def index_documents(documents):
+    """
+    documents: [(данные опции для ответа, {поле из FIELD_WEIGHTS: [тексты]}), ...].
+    Возвращает данные индекса простыми списками и словарями, пригодными для кэша каталога.
+    """
+    postings = defaultdict(dict)
+    for doc_id, (_, fields) in enumerate(documents):
+        for field, texts in fields.items():
+            weight = FIELD_WEIGHTS[field]
+            for text in texts:
+                for token in tokenize(text):
+                    if postings[token].get(doc_id, 0) < weight:
+                        postings[token][doc_id] = weight
+    tokens = sorted(postings)
+    return {
+        'documents': [document for document, _ in documents],
+        'tokens': tokens,
+        'postings': [postings[token] for token in tokens],
+    }
+
+
+def build_search_index():
+    """Данные индекса по названиям сервисов, категориям, пунктам и обязательным полям опций (3 запроса)."""
+    options = (
+        ServiceOption.objects.select_related('service')
+        .prefetch_related('points', 'required_field')
+        .only('id', 'category', 'service__id', 'service__name')
+        .order_by('service_id', 'id')
+    )
+    return index_documents([
+        (
+            {'id': option.pk, 'service_id': option.service_id, 'service_name': option.service.name,
+             'category': option.category},
+            {
+                'service': [option.service.name],
+                'category': [option.category],
+                'points': [point.title for point in option.points.all()],
+                'required_fields': [field.title for field in option.required_field.all()],
+            },
+        )
+        for option in options
+    ])
+
+
+def get_search_index():
+    """
+    Индекс для текущей версии OPTIONS, то есть после любого изменения сервиса, опции,
+    её пунктов или полей собирается заново. В кэше каталога лежат только списки токенов
+    и вхождений, объект индекса создаётся в каждом процессе один раз на версию.
+    """
+    global _index
+    version = get_catalog_version(OPTIONS)
+    index = _index
+    if index is None or index[0] != version:
+        data = get_catalog(OPTIONS, 'search-data', build_search_index, version=version)
+        index = _index = (version, SearchIndex(data['documents'], data['tokens'], data['postings']))
+    return index[1]
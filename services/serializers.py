@@ -1,10 +1,16 @@
 from rest_framework import serializers
-from .models import Service, ServiceOption, PopularServiceOption
+from .cart import MAX_CART_SIZE
+from .discounts import DiscountResolver
+from .icons import get_icon_urls
+from .models import PopularServiceOption, Service, ServiceOption
+from .pricing import from_micros, to_basis_points, unit_price_micros
+from .tiers import get_tier_tables, get_tiers
 from rest_framework.exceptions import ValidationError
 
 class ServiceOptionSerializer(serializers.ModelSerializer):
     discount_percentage = serializers.SerializerMethodField()
     discounted_price = serializers.SerializerMethodField()
+    price_tiers = serializers.SerializerMethodField()
     required_field = serializers.StringRelatedField(many=True)
     points = serializers.StringRelatedField(many=True)
     price_per_unit = serializers.DecimalField(source='price_per_unit.amount', max_digits=15, decimal_places=2)
@@ -26,6 +32,7 @@ class ServiceOptionSerializer(serializers.ModelSerializer):
             'price_per_unit',
             'discount_percentage',
             'discounted_price',
+            'price_tiers',
             'period',
             'required_field',
             'points',
@@ -34,20 +41,40 @@ class ServiceOptionSerializer(serializers.ModelSerializer):
             'is_interval_required'
         ]
 
+    def get_discount_resolver(self, obj):
+        """
+        Скидки пользователя для всех опций списка загружаются один раз и хранятся в общем контексте.
+        Можно передать готовый DiscountResolver в context['discounts'].
+        """
+        resolver = self.context.get('discounts')
+        if resolver is not None:
+            return resolver
+        if not isinstance(self.parent, serializers.ListSerializer) or self.parent.instance is None:
+            # Одиночная или вложенная опция: список заранее неизвестен
+            return DiscountResolver(self.context.get('user'), [obj.pk])
+        resolver = DiscountResolver(self.context.get('user'), [option.pk for option in self.parent.instance])
+        self.context['discounts'] = resolver
+        return resolver
+
     def get_discount_percentage(self, obj):
         user = self.context.get('user', None)
-        if not user:
+        if not user and 'discounts' not in self.context:
             return obj.discount_percentage
-        return max(obj.discount_percentage, obj.get_user_discount(user))
+        return self.get_discount_resolver(obj).get_discount_percentage(obj)
 
     def get_discounted_price(self, obj):
         try:
-            discount_percentage = self.get_discount_percentage(obj)
-            discounted_price = obj.price_per_unit.amount * (1 - discount_percentage / 100)
-            return discounted_price
+            discount_bp = to_basis_points(self.get_discount_percentage(obj))
+            return from_micros(unit_price_micros(obj.price_cents, discount_bp))
         except Exception as e:
             raise ValidationError({"detail": "Ошибка при расчете скидки. " + str(e)})
 
+    def get_price_tiers(self, obj):
+        """Объёмные скидки опции из скомпилированных таблиц, общих для всего списка."""
+        if 'price_tiers' not in self.context:
+            self.context['price_tiers'] = get_tier_tables()
+        return get_tiers(obj.pk, self.context['price_tiers'])
+
 
 class ServiceWithOptionsSerializer(serializers.ModelSerializer):
     options = ServiceOptionSerializer(read_only=True, many=True)
@@ -62,9 +89,15 @@ class ServiceWithOptionsSerializer(serializers.ModelSerializer):
 
 
 class ServiceListSerializer(serializers.ModelSerializer):
+    icons = serializers.SerializerMethodField()
+
     class Meta:
         model = Service
-        fields = ['id', 'name', 'icon_service', 'icon_svg']
+        fields = ['id', 'name', 'icon_service', 'icons']
+
+    def get_icons(self, obj):
+        """URL очищенного SVG и миниатюр изображения, сам SVG в ответ не попадает."""
+        return get_icon_urls(obj.icon_assets)
 
 
 class CategorySerializer(serializers.Serializer):
@@ -75,22 +108,57 @@ class CategorySerializer(serializers.Serializer):
 
 
 class PopularServiceOptionSerializer(serializers.ModelSerializer):
-    icon_url = serializers.SerializerMethodField()
-    icon_svg = serializers.SerializerMethodField()
+    """Закреплённая в админке опция, id - запись PopularServiceOption (прежний ответ popular-services)."""
     service_id = serializers.IntegerField(source='service_option.service.id', read_only=True)
     service_name = serializers.CharField(source='service_option.service.name', read_only=True)
     category_name = serializers.CharField(source='service_option.category', read_only=True)
+    icon_url = serializers.SerializerMethodField()
+    icons = serializers.SerializerMethodField()
 
     class Meta:
         model = PopularServiceOption
-        fields = ['id', 'service_id', 'service_name', 'category_name', 'icon_url', 'icon_svg']
+        fields = ['id', 'service_id', 'service_name', 'category_name', 'icon_url', 'icons']
 
     def get_icon_url(self, obj):
         """Возвращает URL изображения, если оно есть."""
         icon = obj.service_option.service.icon_service
         return icon.url if icon else None
 
-    def get_icon_svg(self, obj):
-        """Возвращает SVG-код, если он есть."""
-        return obj.service_option.service.icon_svg
+    def get_icons(self, obj):
+        """URL очищенного SVG и миниатюр изображения сервиса."""
+        return get_icon_urls(obj.service_option.service.icon_assets)
+
+
+class PopularOptionSerializer(serializers.ModelSerializer):
+    """Опция в списке popular-options: закреплённая вручную или из рейтинга по заказам, id - опция."""
+    service_id = serializers.IntegerField(source='service.id', read_only=True)
+    service_name = serializers.CharField(source='service.name', read_only=True)
+    category_name = serializers.CharField(source='category', read_only=True)
+    icon_url = serializers.SerializerMethodField()
+    icons = serializers.SerializerMethodField()
+    pinned = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ServiceOption
+        fields = ['id', 'service_id', 'service_name', 'category_name', 'icon_url', 'icons', 'pinned']
+
+    def get_icon_url(self, obj):
+        """Возвращает URL изображения, если оно есть."""
+        icon = obj.service.icon_service
+        return icon.url if icon else None
+
+    def get_icons(self, obj):
+        """URL очищенного SVG и миниатюр изображения сервиса."""
+        return get_icon_urls(obj.service.icon_assets)
+
+    def get_pinned(self, obj):
+        return obj.pk in self.context.get('pinned', ())
+
+
+class CartItemSerializer(serializers.Serializer):
+    service_option_id = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField(min_value=1)
+
 
+class CartPriceSerializer(serializers.Serializer):
+    items = CartItemSerializer(many=True, allow_empty=False, max_length=MAX_CART_SIZE)
@@ -0,0 +1,110 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_migrate, post_save, pre_delete
+from django.dispatch import receiver
+
+from users.models import UserServiceDiscount
+from .cache import SERVICES, CATEGORIES, OPTIONS, POPULAR, DISCOUNTS, PRICE_TIERS, bump_catalog_version
+from .models import Category, Service, ServiceOption, RequiredField, PointsServiceOption, PopularServiceOption, \
+    PriceTier
+from .schema import invalidate_custom_data_schemas
+
+
+@receiver(m2m_changed, sender=ServiceOption.required_field.through)
+def required_field_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Сбрасывает схему custom_data при изменении набора обязательных полей опции."""
+    if action == 'pre_clear':
+        # При очистке со стороны поля pk_set не передаётся - берём опции до удаления связей
+        if reverse:
+            invalidate_custom_data_schemas(instance.service_option.values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        invalidate_custom_data_schemas([instance.pk])
+    elif pk_set:
+        invalidate_custom_data_schemas(pk_set)
+
+
+@receiver(post_save, sender=RequiredField)
+def required_field_saved(sender, instance, created, **kwargs):
+    if not created:
+        invalidate_custom_data_schemas(instance.service_option.values_list('pk', flat=True))
+
+
+@receiver(pre_delete, sender=RequiredField)
+def required_field_deleted(sender, instance, **kwargs):
+    invalidate_custom_data_schemas(instance.service_option.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=ServiceOption)
+def service_option_deleted(sender, instance, **kwargs):
+    invalidate_custom_data_schemas([instance.pk])
+
+
+def invalidate_catalog(*groups):
+    """
+    Версия повышается сразу и ещё раз после коммита: иначе запрос, пересобравший кэш
+    по данным до коммита, закрепил бы устаревшие данные под новой версией.
+    """
+    bump_catalog_version(*groups)
+    transaction.on_commit(lambda: bump_catalog_version(*groups))
+
+
+@receiver([post_save, post_delete], sender=Service)
+def invalidate_catalog_on_service_change(sender, **kwargs):
+    invalidate_catalog(SERVICES, CATEGORIES, OPTIONS, POPULAR)
+
+
+@receiver([post_save, post_delete], sender=ServiceOption)
+def invalidate_catalog_on_option_change(sender, **kwargs):
+    invalidate_catalog(CATEGORIES, OPTIONS, POPULAR)
+
+
+@receiver([post_save, post_delete], sender=RequiredField)
+@receiver([post_save, post_delete], sender=PointsServiceOption)
+@receiver(m2m_changed, sender=ServiceOption.required_field.through)
+@receiver(m2m_changed, sender=ServiceOption.points.through)
+def invalidate_catalog_on_option_fields_change(sender, **kwargs):
+    if kwargs.get('action', 'post_').startswith('post_'):
+        invalidate_catalog(OPTIONS)
+
+
+@receiver([post_save, post_delete], sender=PriceTier)
+def invalidate_catalog_on_price_tier_change(sender, **kwargs):
+    invalidate_catalog(PRICE_TIERS, OPTIONS)
+
+
+@receiver([post_save, post_delete], sender=PopularServiceOption)
+def invalidate_catalog_on_popular_change(sender, **kwargs):
+    invalidate_catalog(POPULAR)
+
+
+@receiver([post_save, post_delete], sender=UserServiceDiscount)
+def invalidate_catalog_on_discount_change(sender, **kwargs):
+    invalidate_catalog(DISCOUNTS)
+
+
+@receiver(post_delete, sender=ServiceOption)
+def delete_unused_category(sender, instance, **kwargs):
+    if instance.service_category_id:
+        Category.delete_if_unused(instance.service_category_id)
+
+
+@receiver(post_migrate)
+def fill_service_categories(sender, **kwargs):
+    """Создаёт категории по строкам ServiceOption.category у опций, созданных до появления Category."""
+    if sender.name != 'services':
+        return
+    pairs = set(
+        ServiceOption.objects.filter(service_category__isnull=True).values_list('service_id', 'category')
+    )
+    if not pairs:
+        return
+    Category.objects.bulk_create([Category(service_id=service_id, name=name) for service_id, name in pairs],
+                                 ignore_conflicts=True)
+    for category in Category.objects.filter(service_id__in={service_id for service_id, _ in pairs}):
+        if (category.service_id, category.name) in pairs:
+            ServiceOption.objects.filter(
+                service_id=category.service_id, category=category.name, service_category__isnull=True
+            ).update(service_category=category)
+    print(f"Заполнены категории для {len(pairs)} пар сервис/категория.")
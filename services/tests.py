@@ -1,3 +1,306 @@
-from django.test import TestCase
+import gzip
+import json
+from decimal import Decimal
 
-# Create your tests here.
+from django.core.cache import cache
+from django.forms import inlineformset_factory
+from django.test import SimpleTestCase, TestCase
+from djmoney.money import Money
+from rest_framework.test import APIClient
+
+from orders.pricing import OrderPricing
+from starkstore.testing import QueryBudgetMixin
+from users.models import CustomerUser, UserServiceDiscount
+from .cache import OPTIONS, _local, bump_catalog_version, get_catalog_version
+from .catalog import get_catalog_snapshot
+from .forms import PriceTierInlineFormSet
+from .models import (PointsServiceOption, PopularServiceOption, PriceTier, RequiredField, Service, ServiceOption,
+                     ServiceOptionPopularity)
+from .pricing import (BASIS_POINTS, from_cents, from_micros, line_total_cents, line_totals_cents, to_basis_points,
+                      to_cents)
+from .search import EXACT_MATCH_FACTOR, SearchIndex, index_documents
+from .tiers import build_tier_tables, get_effective_discount_bp, get_tier_discount_bp
+
+
+class CatalogTestCase(TestCase):
+    client_class = APIClient
+
+    def setUp(self):
+        # Кэш каталога общий для процесса: тест начинается с холодного кэша
+        cache.clear()
+        _local.clear()
+        self.user = CustomerUser.objects.create_user(email='user@example.com', password='password')
+        self.client.force_authenticate(self.user)
+        self.service = Service.objects.create(name='YouTube')
+
+    def create_option(self, service=None, category='Views', price='0.50', discount='0'):
+        """Опция со всем, что попадает в ответы: пункт, обязательное поле, ступень и скидка пользователя."""
+        option = ServiceOption.objects.create(service=service or self.service, category=category,
+                                              price_per_unit=Money(price, 'USD'),
+                                              discount_percentage=Decimal(discount))
+        option.points.add(PointsServiceOption.objects.create(title=f'Пункт {option.pk}'))
+        option.required_field.add(RequiredField.objects.create(title=f'Ссылка {option.pk}'))
+        PriceTier.objects.create(service_option=option, min_quantity=1000, discount_percentage=Decimal('20'))
+        UserServiceDiscount.objects.create(user=self.user, service_option=option, discount_percentage=Decimal('15'))
+        return option
+
+
+class CatalogQueryBudgetTests(QueryBudgetMixin, CatalogTestCase):
+    """Число запросов эндпоинтов каталога с холодным кэшем не превышает query_budget и не растёт со списком."""
+
+    def make_options(self, count, category='Views'):
+        for _ in range(ServiceOption.objects.filter(category=category).count(), count):
+            self.create_option(category=category)
+
+    def make_services(self, count):
+        for index in range(Service.objects.filter(options__isnull=False).distinct().count(), count):
+            self.create_option(service=Service.objects.create(name=f'Сервис {index}'))
+
+    def make_popular(self, count):
+        self.make_options(count)
+        for index, option in enumerate(ServiceOption.objects.order_by('id')):
+            if index % 2:
+                PopularServiceOption.objects.get_or_create(service_option=option)
+            else:
+                ServiceOptionPopularity.objects.get_or_create(service_option=option, defaults={'score': index + 1})
+
+    def test_service_list(self):
+        self.assertQueryBudget('/api/v1/service/services/', self.make_services)
+
+    def test_category_list(self):
+        def make_categories(count):
+            for index in range(ServiceOption.objects.count(), count):
+                self.create_option(category=f'Категория {index}')
+
+        self.assertQueryBudget(f'/api/v1/service/services/{self.service.pk}/categories/', make_categories)
+
+    def test_option_list(self):
+        self.assertQueryBudget(f'/api/v1/service/services/{self.service.pk}/categories/Views/', self.make_options)
+
+    def test_catalog(self):
+        self.assertQueryBudget('/api/v1/service/catalog/', self.make_services)
+
+    def test_catalog_discounts(self):
+        self.assertQueryBudget('/api/v1/service/catalog/discounts/', self.make_options)
+
+    def test_search(self):
+        self.assertQueryBudget('/api/v1/service/search/', self.make_options, data={'q': 'you'})
+
+    def test_pinned(self):
+        self.assertQueryBudget('/api/v1/service/popular-services/', self.make_popular)
+
+    def test_popular(self):
+        self.assertQueryBudget('/api/v1/service/popular-options/', self.make_popular)
+
+    def test_cart(self):
+        # Тело запроса дополняется вместе с опциями: клиент кодирует список в момент запроса
+        items = []
+
+        def make_cart(count):
+            self.make_options(count)
+            items[:] = [{'service_option_id': option_id, 'quantity': 1500}
+                        for option_id in ServiceOption.objects.values_list('id', flat=True)]
+
+        self.assertQueryBudget('/api/v1/service/calculate-price/batch/', make_cart, method='post',
+                               data=items, format='json')
+
+
+class PricingTests(SimpleTestCase):
+
+    def test_line_total_rounds_half_cent_up(self):
+        # 1 цент со скидкой 50% = ровно полцента: банковское округление дало бы 0
+        self.assertEqual(line_total_cents(1, 5000, 1), 1)
+        self.assertEqual(line_total_cents(5, 5000, 1), 3)
+        self.assertEqual(line_total_cents(3, 5000, 1), 2)
+        # Чуть меньше половины цента округляется вниз
+        self.assertEqual(line_total_cents(1, 5001, 1), 0)
+
+    def test_line_total_is_exact(self):
+        self.assertEqual(line_total_cents(50, 0, 33), 1650)
+        self.assertEqual(line_total_cents(50, 1000, 33), 1485)
+        # 123.45 * 0.875 * 7 = 756.13125
+        self.assertEqual(line_total_cents(12345, 1250, 7), 75613)
+        self.assertEqual(line_total_cents(12345, BASIS_POINTS, 7), 0)
+
+    def test_line_totals_match_single_line(self):
+        prices, discounts, quantities = [1, 5, 12345, 50], [5000, 5000, 1250, 3333], [1, 1, 7, 100000]
+        self.assertEqual(line_totals_cents(prices, discounts, quantities),
+                         [line_total_cents(*line) for line in zip(prices, discounts, quantities)])
+
+    def test_from_micros_rounds_half_up(self):
+        self.assertEqual(from_micros(437550, places=4), Decimal('0.4376'))
+        self.assertEqual(from_micros(437549, places=4), Decimal('0.4375'))
+        self.assertEqual(from_micros(450000, places=4), Decimal('0.4500'))
+        self.assertEqual(from_micros(50, places=4), Decimal('0.0001'))
+        self.assertEqual(from_micros(437550), Decimal('0.437550'))
+
+    def test_to_basis_points(self):
+        self.assertEqual(to_basis_points(0), 0)
+        self.assertEqual(to_basis_points(10), 1000)
+        self.assertEqual(to_basis_points(Decimal('12.50')), 1250)
+        self.assertEqual(to_basis_points(Decimal('33.33')), 3333)
+        self.assertEqual(to_basis_points(Decimal('100.00')), BASIS_POINTS)
+
+    def test_to_cents(self):
+        self.assertEqual(to_cents(Decimal('0.05')), 5)
+        self.assertEqual(to_cents(Decimal('123.45')), 12345)
+        self.assertEqual(from_cents(12345), Decimal('123.45'))
+
+
+class PriceQuoteTests(CatalogTestCase):
+    """Сумма из calculate-price совпадает с суммой, которую списывает создание заказа."""
+
+    def test_quote_equals_charge_on_half_cents(self):
+        # 0.05 со скидкой 50% = 0.025 за единицу: у нечётных количеств ровно полцента
+        option = ServiceOption.objects.create(service=self.service, category='Likes',
+                                              price_per_unit=Money('0.05', 'USD'), discount_percentage=Decimal('50'))
+        for quantity in (1, 3, 5, 999, 1001):
+            response = self.client.post('/api/v1/service/calculate-price/',
+                                        {'service_option_id': option.pk, 'quantity': quantity}, format='json')
+            charged = OrderPricing.resolve(option, self.user, quantity).total_price.amount
+            self.assertEqual(Decimal(str(response.data['total_price'])), charged)
+        self.assertEqual(OrderPricing.resolve(option, self.user, 1).total_price.amount, Decimal('0.03'))
+
+    def test_quote_equals_charge_with_user_discount_and_tier(self):
+        option = self.create_option(price='0.37', discount='10')
+        for quantity in (1, 7, 999, 1000, 12345):
+            response = self.client.post('/api/v1/service/calculate-price/',
+                                        {'service_option_id': option.pk, 'quantity': quantity}, format='json')
+            charged = OrderPricing.resolve(option, self.user, quantity).total_price.amount
+            self.assertEqual(Decimal(str(response.data['total_price'])), charged)
+
+
+class PriceTierTests(CatalogTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.option = ServiceOption.objects.create(service=self.service, category='Views',
+                                                   price_per_unit=Money('0.50', 'USD'),
+                                                   discount_percentage=Decimal('10'))
+        PriceTier.objects.create(service_option=self.option, min_quantity=1000, discount_percentage=Decimal('12.5'))
+        PriceTier.objects.create(service_option=self.option, min_quantity=5000, discount_percentage=Decimal('20'))
+        self.tables = build_tier_tables()
+
+    def test_tier_thresholds(self):
+        self.assertEqual(self.tables[self.option.pk], ((1000, 5000), (1250, 2000)))
+        for quantity, discount_bp in ((1, 0), (999, 0), (1000, 1250), (4999, 1250), (5000, 2000), (10 ** 9, 2000)):
+            self.assertEqual(get_tier_discount_bp(self.option.pk, quantity, self.tables), discount_bp)
+        self.assertEqual(get_tier_discount_bp(self.option.pk + 1, 5000, self.tables), 0)
+
+    def test_tables_keep_entered_discounts(self):
+        # Таблицы не правят введённые скидки: убывающие ступени отсекает форма в админке
+        PriceTier.objects.create(service_option=self.option, min_quantity=10000, discount_percentage=Decimal('15'))
+        self.assertEqual(build_tier_tables()[self.option.pk], ((1000, 5000, 10000), (1250, 2000, 1500)))
+
+    def test_effective_discount_is_max(self):
+        cases = (
+            (0, 999, 1000),  # скидка опции
+            (15, 999, 1500),  # индивидуальная больше скидки опции
+            (0, 1000, 1250),  # ступень больше скидки опции
+            (15, 1000, 1500),  # индивидуальная больше ступени
+            (15, 5000, 2000),  # ступень больше индивидуальной
+        )
+        for user_discount, quantity, discount_bp in cases:
+            self.assertEqual(get_effective_discount_bp(self.option, user_discount, quantity, self.tables), discount_bp)
+
+
+class PriceTierFormSetTests(CatalogTestCase):
+    FormSet = inlineformset_factory(ServiceOption, PriceTier, formset=PriceTierInlineFormSet,
+                                    fields=('min_quantity', 'discount_percentage'), extra=0)
+
+    def make_formset(self, tiers):
+        data = {'tiers-TOTAL_FORMS': len(tiers), 'tiers-INITIAL_FORMS': 0}
+        for index, (min_quantity, discount) in enumerate(tiers):
+            data[f'tiers-{index}-min_quantity'] = min_quantity
+            data[f'tiers-{index}-discount_percentage'] = discount
+        option = ServiceOption.objects.create(service=self.service, category='Views',
+                                              price_per_unit=Money('0.50', 'USD'))
+        return self.FormSet(data, instance=option, prefix='tiers')
+
+    def test_accepts_growing_discounts(self):
+        # Порядок строк в форме не важен, равная скидка у большего порога допустима
+        self.assertTrue(self.make_formset([(5000, '20'), (1000, '10'), (10000, '20')]).is_valid())
+
+    def test_rejects_decreasing_discount(self):
+        formset = self.make_formset([(1000, '20'), (5000, '15')])
+        self.assertFalse(formset.is_valid())
+        self.assertIn('от 5000 шт.', formset.non_form_errors()[0])
+
+
+class CatalogVersionTests(CatalogTestCase):
+
+    def test_discounts_etag_follows_catalog_version(self):
+        response = self.client.get('/api/v1/service/catalog/discounts/')
+        bump_catalog_version(OPTIONS)
+        fresh = self.client.get('/api/v1/service/catalog/discounts/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(fresh.status_code, 200)
+        self.assertEqual(fresh.data['catalog_version'], get_catalog_version(OPTIONS))
+        self.assertNotEqual(fresh['ETag'], response['ETag'])
+
+    def test_snapshot_version_matches_payload(self):
+        version, snapshot = get_catalog_snapshot()
+        self.assertEqual(json.loads(gzip.decompress(snapshot))['version'], version)
+        bump_catalog_version(OPTIONS)
+        new_version, snapshot = get_catalog_snapshot()
+        self.assertNotEqual(new_version, version)
+        self.assertEqual(json.loads(gzip.decompress(snapshot))['version'], new_version)
+
+    def test_catalog_etag_depends_on_encoding(self):
+        compressed = self.client.get('/api/v1/service/catalog/', HTTP_ACCEPT_ENCODING='gzip')
+        plain = self.client.get('/api/v1/service/catalog/')
+        self.assertEqual(compressed['Content-Encoding'], 'gzip')
+        self.assertNotEqual(compressed['ETag'], plain['ETag'])
+        # ETag сжатого ответа не подходит к распакованному
+        response = self.client.get('/api/v1/service/catalog/', HTTP_IF_NONE_MATCH=compressed['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)['version'], int(response['X-Catalog-Version']))
+        self.assertEqual(self.client.get('/api/v1/service/catalog/', HTTP_ACCEPT_ENCODING='gzip',
+                                         HTTP_IF_NONE_MATCH=compressed['ETag']).status_code, 304)
+
+
+class PopularOptionTests(CatalogTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.pinned_option = self.create_option(category='Likes')
+        self.ranked_option = self.create_option()
+        self.pin = PopularServiceOption.objects.create(service_option=self.pinned_option)
+        ServiceOptionPopularity.objects.create(service_option=self.ranked_option, score=1)
+
+    def test_popular_services_keeps_pinned_entries(self):
+        response = self.client.get('/api/v1/service/popular-services/')
+        self.assertEqual([(item['id'], item['category_name']) for item in response.data], [(self.pin.pk, 'Likes')])
+        self.assertNotIn('pinned', response.data[0])
+
+    def test_popular_options_are_ranked(self):
+        response = self.client.get('/api/v1/service/popular-options/')
+        self.assertEqual([(item['id'], item['pinned']) for item in response.data],
+                         [(self.pinned_option.pk, True), (self.ranked_option.pk, False)])
+
+
+class SearchIndexTests(SimpleTestCase):
+
+    def setUp(self):
+        self.data = index_documents([
+            ({'id': 1}, {'service': ['YouTube'], 'category': ['Views'], 'points': [], 'required_fields': []}),
+            ({'id': 2}, {'service': ['Viewer'], 'category': ['Likes'], 'points': [], 'required_fields': []}),
+            ({'id': 3}, {'service': ['Telegram'], 'category': ['Подписчики'], 'points': ['Живые ёжики'],
+                         'required_fields': []}),
+        ])
+        self.index = SearchIndex(self.data['documents'], self.data['tokens'], self.data['postings'])
+
+    def test_data_is_plain(self):
+        # В кэш каталога попадают только списки и словари, без объекта индекса и заранее умноженных весов
+        self.assertEqual(self.data['tokens'], sorted(self.data['tokens']))
+        self.assertEqual(self.data['postings'][self.data['tokens'].index('views')], {0: 2})
+
+    def test_exact_word_ranks_above_prefix(self):
+        self.assertEqual(self.index.match_prefix('views'), {0: 2 * EXACT_MATCH_FACTOR})
+        self.assertEqual(self.index.match_prefix('view'), {0: 2, 1: 3})
+        self.assertEqual(self.index.search('view'), [{'id': 2}, {'id': 1}])
+
+    def test_all_terms_must_match(self):
+        self.assertEqual(self.index.search('you vie'), [{'id': 1}])
+        self.assertEqual(self.index.search('ежик'), [{'id': 3}])
+        self.assertEqual(self.index.search('you likes'), [])
+        self.assertEqual(self.index.search('  '), [])
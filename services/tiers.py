@@ -0,0 +1,50 @@
+from bisect import bisect_right
+
+from .cache import PRICE_TIERS, get_catalog
+from .models import PriceTier
+from .pricing import from_basis_points, to_basis_points
+
+
+def build_tier_tables():
+    """
+    Ступени всех опций одним запросом: {id опции: (пороги количества, скидки в сотых долях процента)},
+    пороги по возрастанию. Что скидка не убывает с количеством, проверяет форма ступеней в админке.
+    """
+    tables = {}
+    rows = PriceTier.objects.order_by('service_option_id', 'min_quantity').values_list(
+        'service_option_id', 'min_quantity', 'discount_percentage'
+    )
+    for option_id, min_quantity, discount_percentage in rows:
+        thresholds, discounts = tables.setdefault(option_id, ([], []))
+        thresholds.append(min_quantity)
+        discounts.append(to_basis_points(discount_percentage))
+    return {option_id: (tuple(thresholds), tuple(discounts)) for option_id, (thresholds, discounts) in tables.items()}
+
+
+def get_tier_tables():
+    """Таблицы ступеней из кэша каталога: после прогрева расчёт цены не обращается ни к БД, ни к Redis."""
+    return get_catalog(PRICE_TIERS, 'all', build_tier_tables)
+
+
+def get_tier_discount_bp(option_id, quantity, tables=None):
+    """Скидка ступени для количества (двоичный поиск по порогам) или 0."""
+    table = (get_tier_tables() if tables is None else tables).get(option_id)
+    if table is None:
+        return 0
+    index = bisect_right(table[0], quantity) - 1
+    return table[1][index] if index >= 0 else 0
+
+
+def get_effective_discount_bp(service_option, user_discount_percentage, quantity, tables=None):
+    """Большая из скидок опции, индивидуальной и объёмной ступени."""
+    return max(
+        service_option.get_discount_bp(user_discount_percentage),
+        get_tier_discount_bp(service_option.pk, quantity, tables),
+    )
+
+
+def get_tiers(option_id, tables=None):
+    """Ступени опции для API: [{'min_quantity': ..., 'discount_percentage': ...}, ...]."""
+    thresholds, discounts = (get_tier_tables() if tables is None else tables).get(option_id, ((), ()))
+    return [{'min_quantity': min_quantity, 'discount_percentage': from_basis_points(discount_bp)}
+            for min_quantity, discount_bp in zip(thresholds, discounts)]
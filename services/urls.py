@@ -6,6 +6,11 @@ urlpatterns = [
     path('services/<int:service_id>/categories/', views.ServiceCategoryListView.as_view(), name='service-category-list'),
     path('services/<int:service_id>/categories/<str:category>/', views.ServiceOptionListView.as_view(),
          name='service-option-list'),
+    path('catalog/', views.CatalogView.as_view(), name='catalog'),
+    path('catalog/discounts/', views.CatalogDiscountsView.as_view(), name='catalog-discounts'),
+    path('search/', views.CatalogSearchView.as_view(), name='catalog-search'),
     path('popular-services/', views.PopularServiceOptionListView.as_view(), name='popular-service-detail'),
+    path('popular-options/', views.PopularOptionListView.as_view(), name='popular-option-list'),
     path('calculate-price/', views.CalculateOrderPriceView.as_view(), name='calculate-price'),
+    path('calculate-price/batch/', views.CalculateCartPriceView.as_view(), name='calculate-price-batch'),
 ]
@@ -1,63 +1,117 @@
-from django.http import Http404
+import gzip
+import hashlib
+
+from django.http import Http404, HttpResponse
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import etag
 from rest_framework import status
+from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from .models import Service, PopularServiceOption
+from users.models import UserServiceDiscount
+from .cache import SERVICES, CATEGORIES, OPTIONS, POPULAR, DISCOUNTS, catalog_etag, get_catalog, get_catalog_version
+from .cart import price_cart
+from .catalog import get_catalog_snapshot
+from .popularity import get_pinned_options, get_popular_options
+from .search import MAX_SEARCH_LIMIT, SEARCH_LIMIT, get_search_index
+from .discounts import DiscountResolver
+from .models import Category, Service
 from .models import ServiceOption
+from .pricing import from_cents, from_micros, line_total_cents, to_basis_points, to_cents, unit_price_micros
+from .tiers import get_effective_discount_bp
 from .serializers import (
     ServiceListSerializer,
-    ServiceOptionSerializer, PopularServiceOptionSerializer
+    ServiceOptionSerializer, CartPriceSerializer
 )
 
 
+def apply_user_discounts(options, user):
+    """
+    Накладывает индивидуальные скидки пользователя на закэшированный список опций
+    (одним запросом) и возвращает новый список, не меняя общий кэш.
+    """
+    discounts = DiscountResolver(user, [option['id'] for option in options])
+    result = []
+    for option in options:
+        user_discount = discounts.get_user_discount(option['id'])
+        if user_discount > option['discount_percentage']:
+            option = dict(option)
+            option['discount_percentage'] = user_discount
+            option['discounted_price'] = from_micros(
+                unit_price_micros(to_cents(option['price_per_unit']), to_basis_points(user_discount))
+            )
+        result.append(option)
+    return result
+
+
 class ServiceListView(APIView):
+    query_budget = 1
+    # Каталог не зависит от пользователя и открыт без авторизации, такие ответы кэширует nginx
+    permission_classes = [AllowAny]
+
+    @method_decorator(etag(catalog_etag(SERVICES)))
     def get(self, request):
-        services = Service.objects.all()
-        serializer = ServiceListSerializer(services, many=True)
-        return Response(serializer.data)
+        # Исходный SVG в ответ не попадает - только URL файлов иконки
+        services = Service.objects.defer('icon_svg')
+        data = get_catalog(SERVICES, 'all', lambda: list(ServiceListSerializer(services, many=True).data))
+        return Response(data)
 
 
 class ServiceCategoryListView(APIView):
     """
     Список категорий для определенного сервиса.
     """
+    query_budget = 2
+    permission_classes = [AllowAny]
 
+    @method_decorator(etag(catalog_etag(CATEGORIES)))
     def get(self, request, service_id):
-        try:
-            service = Service.objects.get(id=service_id)
-        except Service.DoesNotExist:
+        categories = get_catalog(CATEGORIES, service_id, lambda: self.get_categories(service_id))
+        if categories is None:
             raise Http404(f"Service with ID {service_id} was not found.")
+        return Response({'categories': categories})
 
-        categories = (
-            ServiceOption.objects.filter(service=service)
-            .values_list('category', flat=True)
-            .distinct()
-        )
-        return Response({'categories': list(categories)})
+    def get_categories(self, service_id):
+        """Список категорий или None, если сервиса нет (отсутствие тоже кэшируется)."""
+        if not Service.objects.filter(id=service_id).exists():
+            return None
+        # Только индекс (service_id, name) таблицы категорий
+        return list(Category.objects.filter(service_id=service_id).order_by('name').values_list('name', flat=True))
 
 
 class ServiceOptionListView(APIView):
     """
     Список опций для определенного сервиса и категории.
     """
+    query_budget = 6
 
+    @method_decorator(etag(catalog_etag(OPTIONS, DISCOUNTS, per_user=True)))
     def get(self, request, service_id, category):
+        suffix = f'{service_id}:{hashlib.md5(category.encode()).hexdigest()}'
         try:
-            service = Service.objects.get(id=service_id)
-        except Service.DoesNotExist:
-            return Response({"detail": f"Service with ID {service_id} was not found."}, status=404)
+            options = get_catalog(OPTIONS, suffix, lambda: self.get_options(service_id, category))
+        except Exception as e:
+            return Response({"detail": f"An error occurred while receiving data: {str(e)}"}, status=500)
 
-        options = ServiceOption.objects.filter(service=service, category=category)
-        if not options.exists():
+        if options is None:
+            return Response({"detail": f"Service with ID {service_id} was not found."}, status=404)
+        if not options:
             return Response({"detail": f"No options found for category '{category}'."}, status=404)
 
-        try:
-            # Передача контекста для расчета скидки (пользователь)
-            serializer = ServiceOptionSerializer(options, many=True, context={'user': request.user})
-            return Response(serializer.data)
-        except Exception as e:
-            return Response({"detail": f"An error occurred while receiving data: {str(e)}"}, status=500)
+        # В кэше цены без индивидуальных скидок, они общие для всех пользователей
+        return Response(apply_user_discounts(options, request.user))
+
+    def get_options(self, service_id, category):
+        """Опции без учёта пользователя или None, если сервиса нет."""
+        if not Service.objects.filter(id=service_id).exists():
+            return None
+        options = (
+            ServiceOption.objects.filter(service_id=service_id, service_category__name=category)
+            .select_related('service')
+            .prefetch_related('required_field', 'points')
+        )
+        return list(ServiceOptionSerializer(options, many=True).data)
 
 
 class CalculateOrderPriceView(APIView):
@@ -88,22 +142,116 @@ class CalculateOrderPriceView(APIView):
             return Response({"detail": "Incorrect quantity."}, status=400)
 
         try:
-            # Рассчитываем сумму
-            discounted_price = service_option.get_discounted_price(request.user)  # Цена за единицу с учетом скидки
-            total_price = discounted_price * quantity  # Итоговая сумма
+            # Рассчитываем сумму в центах с тем же округлением, что и при создании заказа
+            discounts = DiscountResolver(request.user, [service_option.pk])
+            discount_bp = get_effective_discount_bp(service_option, discounts.get_user_discount(service_option.pk),
+                                                    quantity)
+            total_cents = line_total_cents(service_option.price_cents, discount_bp, quantity)
         except Exception as e:
             return Response({"detail": f"An error occurred while calculating the amount: {str(e)}"}, status=500)
 
-        # Возвращаем сумму
         return Response({
-            "total_price": round(total_price, 2),  # Округляем до двух знаков
+            "total_price": from_cents(total_cents),
+        })
+
+
+class CalculateCartPriceView(APIView):
+    """
+    Расчёт корзины за один запрос: [{"service_option_id": 1, "quantity": 100}, ...]
+    или {"items": [...]}. Возвращает цену каждой позиции и общую сумму.
+    """
+    query_budget = 3
+
+    def post(self, request):
+        data = {'items': request.data} if isinstance(request.data, list) else request.data
+        serializer = CartPriceSerializer(data=data)
+        serializer.is_valid(raise_exception=True)
+        return Response(price_cart(request.user, serializer.validated_data['items']))
+
+
+def catalog_content_encoding(request):
+    """Снимок каталога хранится сжатым: gzip отдаётся как есть, остальным клиентам - распакованным."""
+    return 'gzip' if 'gzip' in request.headers.get('Accept-Encoding', '') else 'identity'
+
+
+class CatalogView(APIView):
+    """
+    Весь каталог (сервисы -> категории -> опции) одним заранее сжатым JSON.
+    Индивидуальные скидки в снимок не входят, их отдаёт CatalogDiscountsView.
+    """
+    query_budget = 5
+    permission_classes = [AllowAny]
+
+    # Кодировка входит в ETag: сжатый и распакованный ответы - разные байты
+    @method_decorator(etag(catalog_etag(OPTIONS, variant=catalog_content_encoding)))
+    def get(self, request):
+        version, snapshot = get_catalog_snapshot()
+        if catalog_content_encoding(request) == 'gzip':
+            response = HttpResponse(snapshot, content_type='application/json')
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = HttpResponse(gzip.decompress(snapshot), content_type='application/json')
+        response['Vary'] = 'Accept-Encoding'
+        response['X-Catalog-Version'] = version
+        return response
+
+
+class CatalogSearchView(APIView):
+    """
+    Поиск опций по названию сервиса, категории, пунктам и полям: ?q=you vie&limit=20.
+    Слова запроса совпадают и по началу, поэтому подходит для подсказок при вводе.
+    """
+    query_budget = 3
+    permission_classes = [AllowAny]
+
+    @method_decorator(etag(catalog_etag(OPTIONS)))
+    def get(self, request):
+        try:
+            limit = min(int(request.query_params.get('limit', SEARCH_LIMIT)), MAX_SEARCH_LIMIT)
+        except ValueError:
+            return Response({"detail": "Incorrect limit."}, status=400)
+        if limit <= 0:
+            return Response({"detail": "Incorrect limit."}, status=400)
+        return Response(get_search_index().search(request.query_params.get('q', ''), limit))
+
+
+class CatalogDiscountsView(APIView):
+    """Индивидуальные скидки пользователя {id опции: процент} для наложения на снимок каталога."""
+    query_budget = 1
+
+    # В ответе есть catalog_version, поэтому ETag зависит и от версии опций
+    @method_decorator(etag(catalog_etag(OPTIONS, DISCOUNTS, per_user=True)))
+    def get(self, request):
+        discounts = UserServiceDiscount.objects.filter(user=request.user).values_list(
+            'service_option_id', 'discount_percentage'
+        )
+        return Response({
+            'catalog_version': get_catalog_version(OPTIONS),
+            'discounts': {str(option_id): discount for option_id, discount in discounts},
         })
 
 
 class PopularServiceOptionListView(APIView):
-    """Вывод списка популярных услуг."""
+    """
+    Вывод списка популярных услуг, закреплённых в админке. Формат ответа прежний:
+    id - запись PopularServiceOption. Список с рейтингом по заказам отдаёт PopularOptionListView.
+    """
+    query_budget = 1
+    permission_classes = [AllowAny]
+
+    @method_decorator(etag(catalog_etag(POPULAR)))
+    def get(self, request):
+        return Response(get_catalog(POPULAR, 'pinned', get_pinned_options), status=status.HTTP_200_OK)
+
+
+class PopularOptionListView(APIView):
+    """
+    Популярные опции: закреплённые в админке (pinned), затем лучшие по рейтингу заказов, id - опция.
+    Рейтинг обновляется по мере обработки заказов (services.popularity).
+    """
+    query_budget = 3
+    permission_classes = [AllowAny]
 
+    @method_decorator(etag(catalog_etag(POPULAR)))
     def get(self, request):
-        popular_services = PopularServiceOption.objects.all()
-        serializer = PopularServiceOptionSerializer(popular_services, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return Response(get_catalog(POPULAR, 'all', get_popular_options), status=status.HTTP_200_OK)
@@ -53,6 +53,7 @@ CORS_ALLOW_HEADERS = [
     "user-agent",
     "x-csrftoken",
     "x-requested-with",
+    "idempotency-key",
 ]
 INSTALLED_APPS = [
     'django.contrib.admin',
@@ -147,6 +148,13 @@ DATABASES = {
     }
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': env('REDIS_URL', default='redis://service_redis:6379/1'),
+    }
+}
+
 AUTH_USER_MODEL = 'users.CustomerUser'
 
 DOMAIN = env('DOMAIN')
@@ -281,3 +289,9 @@ DJOSER = {
 
 PLISIO_API_KEY = env('PLISIO_API_KEY')
 PLISIO_API_URL = env('PLISIO_API_URL')
+
+# Сколько хранится ответ на запрос с заголовком Idempotency-Key
+IDEMPOTENCY_KEY_TTL = timedelta(hours=24)
+
+# Приём заказов с ответом 202: в запросе только проверка и резерв средств, заказ создаёт process_order_intake
+ORDER_INTAKE_ASYNC = env.bool('ORDER_INTAKE_ASYNC', default=False)
@@ -0,0 +1,44 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+
+
+class QueryBudgetMixin:
+    """
+    Примесь к TestCase для контроля числа SQL-запросов эндпоинтов-списков.
+
+    Бюджет задаётся атрибутом query_budget у самого view. Тест падает, если
+    запрос превышает бюджет или если число запросов растёт вместе с числом
+    строк (признак N+1). Клиент должен быть уже авторизован.
+    """
+
+    def get_query_budget(self, url):
+        view_class = getattr(resolve(url).func, 'view_class', None)
+        budget = getattr(view_class, 'query_budget', None)
+        if budget is None:
+            self.fail(f'{url}: у view не задан query_budget')
+        return budget
+
+    def count_queries(self, url, method='get', **kwargs):
+        with CaptureQueriesContext(connection) as context:
+            response = getattr(self.client, method)(url, **kwargs)
+        self.assertLess(response.status_code, 400, f'{url}: статус {response.status_code}')
+        return len(context.captured_queries), context.captured_queries
+
+    def assertQueryBudget(self, url, make_rows, sizes=(1, 10), method='get', **kwargs):
+        """
+        Для каждого размера из sizes вызывает make_rows(n), чтобы довести число
+        строк до n, затем выполняет запрос и сверяет число SQL-запросов с бюджетом.
+        """
+        budget = self.get_query_budget(url)
+        counts = []
+        for size in sizes:
+            make_rows(size)
+            count, queries = self.count_queries(url, method=method, **kwargs)
+            sql = '\n'.join(query['sql'] for query in queries)
+            self.assertLessEqual(count, budget, f'{url}: {count} запросов при бюджете {budget}\n{sql}')
+            counts.append(count)
+
+        self.assertEqual(len(set(counts)), 1, f'{url}: число запросов растёт с числом строк: '
+                                              f'{dict(zip(sizes, counts))}')
+        return counts
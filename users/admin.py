@@ -94,6 +94,9 @@ class AdminCustomerUser(admin.ModelAdmin):
 
                 if item.order:
                     order_link = f"<a href='/api/admin/orders/order/{item.order.pk}/change/'>{item.order.service_option}</a>"
+                elif item.archived_order:
+                    order_link = (f"<a href='/api/admin/orders/archivedorder/{item.archived_order.pk}/change/'>"
+                                  f"{item.archived_order.option_name} for {item.archived_order.service_name}</a>")
                 else:
                     order_link = "Пополнение через Plesio"
 
@@ -166,6 +166,10 @@ class BalanceHistory(models.Model):
         'orders.Order', on_delete=models.SET_NULL,
         null=True, blank=True, related_name='balance_history', verbose_name='Заказ'
     )
+    archived_order = models.ForeignKey(
+        'orders.ArchivedOrder', on_delete=models.SET_NULL,
+        null=True, blank=True, related_name='balance_history', verbose_name='Архивный заказ'
+    )
 
     class Meta:
         verbose_name = "История баланса"
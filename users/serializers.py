@@ -85,6 +85,12 @@ class BalanceHistorySerializer(serializers.ModelSerializer):
                     'service_option': obj.order.service_option.category,
                     'quantity': obj.order.quantity,
                 }
+            if obj.archived_order:
+                return {
+                    'service': obj.archived_order.service_name,
+                    'service_option': obj.archived_order.option_name,
+                    'quantity': obj.archived_order.quantity,
+                }
             return None
         except Exception as e:
             logger.error("Ошибка при получении деталей заказа: %s", e)
@@ -1,5 +1,8 @@
 import hashlib
 
+from orders.tests import OrderTestCase
+from starkstore.testing import QueryBudgetMixin
+
 
 def generate_signature():
     """
@@ -19,3 +22,10 @@ def generate_signature():
 
 
     return signature
+
+
+class BalanceHistoryQueryBudgetTests(QueryBudgetMixin, OrderTestCase):
+
+    def test_balance_history(self):
+        # Каждый заказ пишет запись истории со ссылкой на себя
+        self.assertQueryBudget('/api/v1/user/balance-history/', self.make_orders)
@@ -21,6 +21,7 @@ from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from orders.idempotency import idempotent
 from .models import CustomerUser, InfoMessage
 from .models import GlobalMessage, UserGlobalMessageStatus, BalanceHistory, BalanceTopUp
 from .serializers import GlobalMessageSerializer, BalanceHistorySerializer, ResetPasswordSerializer, \
@@ -188,9 +189,14 @@ class InfoMessageView(APIView):
 
 class BalanceHistoryView(generics.ListAPIView):
     serializer_class = BalanceHistorySerializer
+    query_budget = 1
 
     def get_queryset(self):
-        return BalanceHistory.objects.filter(user=self.request.user).order_by('-create_time')
+        return (
+            BalanceHistory.objects.filter(user=self.request.user)
+            .select_related('order__service', 'order__service_option', 'archived_order')
+            .order_by('-create_time')
+        )
 
 
 plisio_client = PlisioClient(api_key=settings.PLISIO_API_KEY)
@@ -198,6 +204,7 @@ plisio_client = PlisioClient(api_key=settings.PLISIO_API_KEY)
 
 class CreateTopUpView(APIView):
 
+    @idempotent
     def post(self, request):
         logger.info(f"📥 Получен запрос на пополнение: {request.data}")
         user = request.user